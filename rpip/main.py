@@ -1,12 +1,24 @@
 import argparse
+import http.client
+import mmap
+import ssl
 import subprocess
 import json
 import os
+import queue
+import re
 import shutil
 import sys
-from typing import List, Tuple, Optional
-from urllib.parse import urlparse, unquote
-from urllib.request import Request, urlopen
+import sysconfig
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, TextIO, Tuple
+from urllib.parse import quote, urljoin, urlparse, unquote
+from urllib.request import Request, getproxies, proxy_bypass, urlopen
 from urllib.error import HTTPError, URLError
 import hashlib
 
@@ -19,41 +31,441 @@ if hasattr(sys.stderr, 'reconfigure'):
 
 # --- Constants ---
 # Downloader Preference: external tools are faster, Python fallback is always available
-DOWNLOADER_PREFERENCE = ["aria2c", "wget", "curl", "python"]
+DOWNLOADER_PREFERENCE = ("aria2c", "wget", "curl", "python")
+
+# Leading project name of a requirement spec (followed by extras, a specifier, a marker, or a URL)
+REQUIREMENT_NAME_RE = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(?:[<>=!~;@(]|$)')
+
+# Pip options from a requirements file that should be preserved
+PRESERVED_OPTIONS = frozenset({
+    '--index-url', '--extra-index-url', '--trusted-host',
+    '--find-links', '--no-index', '--prefer-binary',
+    '--pre', '--no-binary', '--only-binary'
+})
+
+# Classifies each non-empty line of a requirements file in a single finditer() pass.
+# The matched named group tells the kind of line; comment lines match no group.
+# Options are told apart afterwards by their first token.
+# Trailing comments are stripped only when preceded by whitespace, so the
+# '#egg=' fragment of a VCS URL survives.
+REQUIREMENTS_LINE_RE = re.compile(r'''
+    ^[ \t]*
+    (?:
+        \#[^\n]*
+      | (?:-r|--requirement)(?:[ \t]*=[ \t]*|[ \t]*)(?P<nested>[^\n]*?)
+      | (?P<editable>(?:-e[ \t]|--editable)[^\n]*?)
+      | (?P<option>-[^\n]*?)
+      | (?P<package>[^\s\#][^\n]*?)
+    )
+    (?:[ \t]+\#[^\n]*)?
+    [ \t\r]*$
+''', re.MULTILINE | re.VERBOSE)
+
+# Editable requirement prefix; the group is the path or URL after it
+EDITABLE_RE = re.compile(r'(?:-e[ \t]|--editable[ \t=])\s*(.*?)\s*$')
+
+# Cache of pip resolution results, so repeated runs can skip the pip subprocess
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'rpip')
+RESOLVE_CACHE_DIR = os.path.join(CACHE_DIR, 'resolve')
+RESOLVE_CACHE_TTL = 6 * 60 * 60  # seconds
+
+# Size and hash of verified downloads, so a wheel kept after a failed install is reused
+DOWNLOAD_CACHE_DIR = os.path.join(CACHE_DIR, 'wheels')
+
+# Exact pins resolved straight from PyPI's JSON API instead of running pip
+EXACT_PIN_RE = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*==\s*([A-Za-z0-9][A-Za-z0-9._+!-]*)\s*$')
+PYPI_JSON_URL = 'https://pypi.org/pypi/{name}/{version}/json'
+PYPI_SIMPLE_URL = 'https://pypi.org/simple'
+
+# pip configuration options that make pip pick something other than the best PyPI wheel
+FAST_RESOLVE_BLOCKING_OPTIONS = frozenset({
+    'extra-index-url', 'find-links', 'no-index', 'no-binary', 'only-binary',
+    'platform', 'python-version', 'implementation', 'abi', 'ignore-requires-python'
+})
+
+# pip settings from the environment that change what a spec resolves to
+PIP_INDEX_ENV_VARS = (
+    'PIP_INDEX_URL', 'PIP_EXTRA_INDEX_URL', 'PIP_FIND_LINKS', 'PIP_NO_INDEX', 'PIP_TRUSTED_HOST',
+    'PIP_PRE', 'PIP_PREFER_BINARY', 'PIP_NO_BINARY', 'PIP_ONLY_BINARY'
+)
+# The same settings as pip configuration options, e.g. 'index-url'
+PIP_INDEX_OPTIONS = frozenset(name[4:].lower().replace('_', '-') for name in PIP_INDEX_ENV_VARS)
+
+# Large files are fetched over several connections when the server supports range requests
+PARALLEL_DOWNLOAD_CONNECTIONS = 8
+PARALLEL_DOWNLOAD_MIN_SIZE = 16 * 1024 * 1024
+PARALLEL_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Idle keep-alive connections kept per host, so repeated requests skip the TCP/TLS handshake
+HTTP_POOL_MAXSIZE = 32
+HTTP_MAX_REDIRECTS = 5
+HTTP_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# aria2c downloads all packages of a requirements file in one run, with several connections per file
+ARIA2C_CONNECTIONS_PER_FILE = 16
+ARIA2C_CHECKSUM_NAMES = {'sha256': 'sha-256', 'sha512': 'sha-512', 'md5': 'md5'}
+
+# Read/write size of downloads, and minimum delay between progress updates
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+PROGRESS_INTERVAL = 0.1  # seconds
+
+# The progress line is redrawn after a carriage return; on POSIX terminals the
+# ANSI "erase to end of line" sequence removes leftovers of a longer previous line
+MIB = 1024 * 1024
+PROGRESS_PREFIX = "\r   Progress: "
+PROGRESS_CLEAR_LINE = "\x1b[K" if os.name == 'posix' else ""
+
+# Largest file hashed through a single mmap (32-bit builds cannot map more than 2 GiB)
+MMAP_MAX_SIZE = sys.maxsize if sys.maxsize > 2**32 else 2**31 - 1
+HASH_FALLBACK_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Sidecar file recording which byte ranges of a preallocated download are complete
+DOWNLOAD_STATE_SUFFIX = '.rpip-state'
+DOWNLOAD_STATE_INTERVAL = 1.0  # seconds between state updates of a single-stream download
+# Flags for opening a download in place; O_BINARY keeps Windows from translating newlines
+DOWNLOAD_OPEN_FLAGS = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+
+# Maximum number of requirements-file packages resolved and downloaded concurrently
+MAX_PARALLEL_INSTALLS = 8
+
+# Pending installs handed from download workers to the installer thread
+INSTALL_QUEUE_SIZE = 2
+
+# Serializes the final pip install so concurrent callers never write site-packages at once
+_install_lock = threading.Lock()
+
+# Queue of the installer thread while a requirements file is processed, otherwise None
+_install_queue = None
+
+# Per-filename locks so duplicate specs never download into the same file concurrently
+_download_locks = {}
+_download_locks_guard = threading.Lock()
+
+# Set when the user interrupts a parallel run, so worker downloads stop early
+_shutdown_requested = threading.Event()
+
+# Per-thread output buffer used while packages are installed in parallel
+_task_output = threading.local()
+
+# --- Output Buffering ---
+
+class _BufferedStream:
+    """Stream proxy that diverts writes from worker threads into their task buffer."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        chunks = getattr(_task_output, 'chunks', None)
+        if chunks is None:
+            return self._stream.write(text)
+        chunks.append((self._stream, text))
+        return len(text)
+
+    def flush(self):
+        if getattr(_task_output, 'chunks', None) is None:
+            self._stream.flush()
+
+    def isatty(self):
+        # Buffered output is replayed later, so workers must behave as non-interactive
+        if getattr(_task_output, 'chunks', None) is not None:
+            return False
+        return self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+@contextmanager
+def _buffered_output():
+    """Routes output of worker threads into per-task buffers for the duration of the block."""
+    original_stdout, original_stderr = sys.stdout, sys.stderr
+    sys.stdout = _BufferedStream(original_stdout)
+    sys.stderr = _BufferedStream(original_stderr)
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+
+def _replay_output(chunks: List[Tuple[object, str]]):
+    """Writes buffered output of a finished task to the real streams in one go."""
+    for stream, text in chunks:
+        stream.write(text)
+    for stream in {stream for stream, _ in chunks}:
+        stream.flush()
+
+def _download_lock(filename: str) -> threading.Lock:
+    """Returns the lock guarding downloads into the given file."""
+    with _download_locks_guard:
+        return _download_locks.setdefault(filename, threading.Lock())
+
+def _installer_loop(jobs: queue.Queue):
+    """Runs queued install steps one at a time until the None sentinel arrives."""
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        func, args, chunks, reply = job
+        # Output of the install belongs to the buffer of the task that queued it
+        _task_output.chunks = chunks
+        try:
+            reply.put((func(*args), None))
+        except BaseException as e:
+            reply.put((False, e))
+        finally:
+            _task_output.chunks = None
+
+@contextmanager
+def _installer_thread():
+    """Runs a dedicated installer thread, so downloads and installs form a pipeline."""
+    global _install_queue
+    jobs = queue.Queue(maxsize=INSTALL_QUEUE_SIZE)
+    installer = threading.Thread(target=_installer_loop, args=(jobs,), name='rpip-installer', daemon=True)
+    installer.start()
+    _install_queue = jobs
+    try:
+        yield
+    finally:
+        _install_queue = None
+        jobs.put(None)
+        installer.join()
+
+def _run_install(func, *args) -> bool:
+    """Runs an install step on the installer thread if one is running, otherwise under _install_lock."""
+    jobs = _install_queue
+    if jobs is None:
+        with _install_lock:
+            return func(*args)
+
+    reply = queue.Queue(maxsize=1)
+    jobs.put((func, args, getattr(_task_output, 'chunks', None), reply))
+    success, error = reply.get()
+    if error is not None:
+        raise error
+    return success
+
+def _run_subprocess(cmd: List[str]) -> subprocess.CompletedProcess:
+    """Runs a command with check=True, capturing its output when called from a buffered worker."""
+    if getattr(_task_output, 'chunks', None) is None:
+        return subprocess.run(cmd, check=True)
+
+    try:
+        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True)
+    except subprocess.CalledProcessError as e:
+        if e.output:
+            sys.stdout.write(e.output)
+        raise
+    if result.stdout:
+        sys.stdout.write(result.stdout)
+    return result
 
 # --- Helper Functions ---
 
+@lru_cache(maxsize=1)
 def check_downloader() -> str:
-    """Checks for the presence of a preferred resumable downloader."""
-    for tool in DOWNLOADER_PREFERENCE:
-        if tool == "python":
-            return tool  # Python urllib is always available
-        if shutil.which(tool):
-            return tool
-    # This should never happen since python is in the list
-    return "python"
+    """Checks for the presence of a preferred resumable downloader.
+
+    RPIP_DOWNLOADER selects a downloader without probing PATH. The result is
+    computed once per process.
+    """
+    override = os.environ.get('RPIP_DOWNLOADER')
+    if override:
+        if override not in DOWNLOADER_PREFERENCE:
+            raise RuntimeError(f"Unsupported downloader in RPIP_DOWNLOADER: {override} "
+                               f"(choose from {', '.join(DOWNLOADER_PREFERENCE)})")
+        return override
+
+    # Python urllib is always available, so the search always ends at "python"
+    return next(tool for tool in DOWNLOADER_PREFERENCE if tool == "python" or shutil.which(tool))
+
+def _pip_report(package_specs: List[str]) -> dict:
+    """Runs 'pip install --dry-run --report' for the given specs and returns the parsed report."""
+    # The report goes to its own file, so it is decoded straight from disk
+    # instead of being searched for in pip's console output
+    fd, report_path = tempfile.mkstemp(prefix='rpip-report-', suffix='.json')
+    os.close(fd)
+    try:
+        # We use a known-good command to force pip to resolve the candidate wheel
+        cmd = [
+            sys.executable, "-m", "pip", "install",
+            *package_specs, "--ignore-installed",
+            "--dry-run", "--no-deps", "--report", report_path
+        ]
+
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        with open(report_path, 'rb') as f:
+            return json.load(f)
+    finally:
+        os.remove(report_path)
+
+def _resolution_from_download_info(download_info: dict) -> Tuple[str, str, Optional[str]]:
+    """Extracts URL, filename, and hash from a 'download_info' entry of a pip report."""
+    url = download_info['url']
+
+    # Properly extract filename from URL using urlparse
+    parsed_url = urlparse(url)
+    filename = unquote(os.path.basename(parsed_url.path))
+
+    # Extract hash if available for integrity checking
+    archive_info = download_info.get('archive_info', {})
+    file_hash = archive_info.get('hash', None)
+
+    return url, filename, file_hash
+
+def _normalize_name(name: str) -> str:
+    """Normalizes a project name as described in PEP 503."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def _requirement_name(package_spec: str) -> Optional[str]:
+    """Returns the normalized project name of a requirement spec, or None for paths and URLs."""
+    match = REQUIREMENT_NAME_RE.match(package_spec)
+    return _normalize_name(match.group(1)) if match else None
+
+def _cache_enabled() -> bool:
+    """Returns False when caching is disabled via RPIP_NO_CACHE."""
+    return os.environ.get('RPIP_NO_CACHE', '') in ('', '0')
+
+def _resolve_cache_path(package_spec: str) -> str:
+    """Returns the cache file for a spec resolved by this interpreter, platform, and index setup."""
+    index_config = tuple((name, os.environ[name]) for name in PIP_INDEX_ENV_VARS if name in os.environ)
+    # pip.conf files can set the index too
+    index_config += tuple((key, value) for key, value in _load_pip_config_items() or ()
+                          if key.rsplit('.', 1)[-1] in PIP_INDEX_OPTIONS)
+    key = hashlib.sha256(repr((
+        package_spec, sys.implementation.name, sys.version_info[:2],
+        sysconfig.get_platform(), index_config
+    )).encode()).hexdigest()
+    return os.path.join(RESOLVE_CACHE_DIR, f"{key}.json")
+
+def _load_cached_resolution(package_spec: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Returns the cached (url, filename, hash) of a spec, or None if missing or expired."""
+    if not _cache_enabled():
+        return None
+
+    path = _resolve_cache_path(package_spec)
+    try:
+        if time.time() - os.path.getmtime(path) > RESOLVE_CACHE_TTL:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        return cached['url'], cached['filename'], cached.get('hash')
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _store_cached_resolution(package_spec: str, resolution: Tuple[str, str, Optional[str]]):
+    """Atomically writes the (url, filename, hash) of a spec to the resolve cache."""
+    if not _cache_enabled():
+        return
+
+    url, filename, file_hash = resolution
+    try:
+        os.makedirs(RESOLVE_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=RESOLVE_CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'spec': package_spec, 'url': url, 'filename': filename, 'hash': file_hash}, f)
+            os.replace(tmp_path, _resolve_cache_path(package_spec))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass  # The cache is an optimization only
+
+@lru_cache(maxsize=None)
+def _load_pip_config_items() -> Optional[List[Tuple[str, str]]]:
+    """Returns pip's configuration as ('section.option', value) pairs, or None if it cannot be loaded."""
+    try:
+        from pip._internal.configuration import Configuration
+        configuration = Configuration(isolated=False)
+        configuration.load()
+        return list(configuration.items())
+    except Exception:
+        return None
+
+def _uses_default_index() -> bool:
+    """Returns True if pip's configuration would pick the best PyPI wheel like fast_resolve does."""
+    items = _load_pip_config_items()
+    if items is None:
+        return False
+
+    for key, value in items:
+        option = key.rsplit('.', 1)[-1]
+        if option == 'index-url' and value.rstrip('/') != PYPI_SIMPLE_URL:
+            return False
+        if option in FAST_RESOLVE_BLOCKING_OPTIONS:
+            return False
+    return True
+
+def fast_resolve(package_spec: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Resolves an exact 'name==version' pin through PyPI's JSON API, without running pip.
+
+    Picks the wheel pip would prefer for this interpreter. Returns None whenever
+    the answer might differ from pip's (custom index, no compatible wheel,
+    yanked files, unsupported Python), so callers fall back to pip.
+    """
+    match = EXACT_PIN_RE.match(package_spec)
+    if not match or not _uses_default_index():
+        return None
+    name, version = match.groups()
+
+    try:
+        from pip._vendor.packaging.specifiers import SpecifierSet
+        from pip._vendor.packaging.tags import sys_tags
+        from pip._vendor.packaging.utils import parse_wheel_filename
+    except ImportError:
+        return None
+
+    url = PYPI_JSON_URL.format(name=quote(name), version=quote(version))
+    try:
+        with _open_url(url, {'Accept': 'application/json'}, timeout=10) as response:
+            release = json.load(response)
+    except (OSError, ValueError):  # HTTPError and URLError are OSErrors
+        return None
+
+    priorities = {tag: rank for rank, tag in enumerate(sys_tags())}
+    python_version = '.'.join(map(str, sys.version_info[:3]))
+    candidates = []
+    try:
+        for file in release['urls']:
+            if file.get('packagetype') != 'bdist_wheel' or file.get('yanked'):
+                continue
+            requires_python = file.get('requires_python')
+            if requires_python and python_version not in SpecifierSet(requires_python):
+                continue
+            _, _, build, tags = parse_wheel_filename(file['filename'])
+            ranks = [priorities[tag] for tag in tags if tag in priorities]
+            if not ranks:
+                continue
+            candidates.append((-min(ranks), build, file))
+        if not candidates:
+            return None
+        # Best tag first, then the highest build number, like pip
+        _, _, file = max(candidates, key=lambda candidate: candidate[:2])
+        return file['url'], file['filename'], f"sha256={file['digests']['sha256']}"
+    except Exception:  # Malformed metadata or filenames, let pip decide
+        return None
 
 def resolve_package(package_spec: str) -> Tuple[str, str, Optional[str]]:
-    """Uses 'pip install --dry-run --report' to find the best URL, filename, and hash."""
+    """Uses 'pip install --dry-run --report' to find the best URL, filename, and hash.
+
+    Exact pins are resolved through fast_resolve when possible. Results are
+    cached for RESOLVE_CACHE_TTL seconds (disable with RPIP_NO_CACHE=1).
+    """
+    cached = _load_cached_resolution(package_spec)
+    if cached:
+        print(f"🔍 Resolving package: {package_spec} (cached)")
+        return cached
+
+    resolution = fast_resolve(package_spec)
+    if resolution:
+        print(f"🔍 Resolving package: {package_spec} (PyPI JSON API)")
+        _store_cached_resolution(package_spec, resolution)
+        return resolution
+
     print(f"🔍 Resolving package: {package_spec}")
 
-    # We use a known-good command to force pip to resolve the candidate wheel
-    cmd = [
-        sys.executable, "-m", "pip", "install",
-        package_spec, "--ignore-installed",
-        "--dry-run", "--no-deps", "--report", "-"
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        # Extract only the JSON part from stdout
-        stdout_str = result.stdout
-        json_start = stdout_str.find('{')
-        json_end = stdout_str.rfind('}')
-        if json_start == -1 or json_end == -1:
-            raise RuntimeError("Could not find JSON report in pip output.")
-        json_report_str = stdout_str[json_start : json_end + 1]
-        report = json.loads(json_report_str)
+    try:
+        report = _pip_report([package_spec])
     except subprocess.CalledProcessError as e:
         print(f"❌ Error during pip resolution (Code {e.returncode}):\n{e.stderr}", file=sys.stderr)
         raise RuntimeError(f"Could not resolve package '{package_spec}'.")
@@ -63,49 +475,412 @@ def resolve_package(package_spec: str) -> Tuple[str, str, Optional[str]]:
 
     # Safely extract URL, filename, and hash from the report
     try:
-        download_info = report['install'][0]['download_info']
-        url = download_info['url']
-
-        # Properly extract filename from URL using urlparse
-        parsed_url = urlparse(url)
-        filename = unquote(os.path.basename(parsed_url.path))
-
-        # Extract hash if available for integrity checking
-        archive_info = download_info.get('archive_info', {})
-        file_hash = archive_info.get('hash', None)
-
-        return url, filename, file_hash
+        resolution = _resolution_from_download_info(report['install'][0]['download_info'])
     except (KeyError, IndexError) as e:
         raise RuntimeError(f"Could not find a valid download URL for '{package_spec}': {e}")
 
-def download_with_python(url: str, filename: str):
-    """Native Python downloader with resume support using urllib."""
+    _store_cached_resolution(package_spec, resolution)
+    return resolution
 
-    is_interactive = sys.stdout.isatty()
+def resolve_packages(package_specs: List[str]) -> Dict[str, Tuple[str, str, Optional[str]]]:
+    """Resolves several package specs with a single 'pip install --dry-run --report' run.
 
-    # Check if file exists and get its size for resume
-    resume_pos = 0
-    mode = 'wb'
-    if os.path.exists(filename):
-        resume_pos = os.path.getsize(filename)
-        mode = 'ab'
-        if is_interactive:
-            print(f"   Resuming from byte {resume_pos}")
+    Returns:
+        Dict mapping each resolved spec to its (url, filename, hash). Specs that
+        could not be matched to a report entry (paths, URLs, markers that do not
+        apply) are left out so callers can fall back to resolve_package.
+        Specs found in the resolve cache are not passed to pip at all.
+    """
+    resolutions = {}
+    names = {}
+    for package_spec in package_specs:
+        name = _requirement_name(package_spec)
+        if not name:
+            continue
+        cached = _load_cached_resolution(package_spec)
+        if cached:
+            resolutions[package_spec] = cached
         else:
-            print(f"   Resuming download for {filename} from byte {resume_pos}...")
+            names[package_spec] = name
+
+    if resolutions:
+        print(f"🔍 Using cached resolution for {len(resolutions)} package(s)")
+
+    # Exact pins are looked up on PyPI concurrently, the rest goes to pip
+    pinned = [package_spec for package_spec in names if EXACT_PIN_RE.match(package_spec)]
+    if pinned and _uses_default_index():
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_INSTALLS, len(pinned))) as executor:
+            fast_resolutions = dict(zip(pinned, executor.map(fast_resolve, pinned)))
+        fast_resolved = 0
+        for package_spec, resolution in fast_resolutions.items():
+            if resolution:
+                resolutions[package_spec] = resolution
+                _store_cached_resolution(package_spec, resolution)
+                del names[package_spec]
+                fast_resolved += 1
+        if fast_resolved:
+            print(f"🔍 Resolved {fast_resolved} pinned package(s) through the PyPI JSON API")
+
+    if not names:
+        return resolutions
+
+    print(f"🔍 Resolving {len(names)} package(s) in a single pip run...")
+
+    try:
+        report = _pip_report(list(names))
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  Batch resolution failed (Code {e.returncode}), resolving packages one by one.", file=sys.stderr)
+        return resolutions
+    except json.JSONDecodeError as e:
+        print(f"⚠️  Could not parse batch resolution report ({e}), resolving packages one by one.", file=sys.stderr)
+        return resolutions
+
+    resolved_by_name = {}
+    for entry in report.get('install', []):
+        try:
+            name = _normalize_name(entry['metadata']['name'])
+            resolved_by_name[name] = _resolution_from_download_info(entry['download_info'])
+        except KeyError:
+            continue
+
+    for package_spec, name in names.items():
+        if name in resolved_by_name:
+            resolutions[package_spec] = resolved_by_name[name]
+            _store_cached_resolution(package_spec, resolved_by_name[name])
+
+    return resolutions
+
+class _ConnectionPool:
+    """Thread-safe pool of idle keep-alive HTTP(S) connections keyed by (scheme, host, port)."""
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    def get(self, key: Tuple[str, str, int], timeout: float,
+            reuse: bool = True) -> Tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused), preferring an idle connection when reuse is True."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if reuse and idle:
+                return idle.pop(), True
+            if key[0] == 'https' and self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def put(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection):
+        """Returns a connection whose response was fully read to the pool."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+_http_pool = _ConnectionPool(HTTP_POOL_MAXSIZE)
+
+def _uses_proxy(parsed_url) -> bool:
+    """Checks whether urllib would route the URL through a configured proxy."""
+    return parsed_url.scheme in getproxies() and not proxy_bypass(parsed_url.hostname or '')
+
+def _send_request(key: Tuple[str, str, int], target: str, headers: dict,
+                  timeout: float) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+    """Sends a GET request on a pooled connection, retrying once if an idle one went stale."""
+    reuse = True
+    while True:
+        conn, reused = _http_pool.get(key, timeout, reuse)
+        try:
+            conn.request('GET', target, headers=headers)
+            return conn, conn.getresponse()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            if not reused:
+                raise URLError(e)
+            reuse = False
+
+@contextmanager
+def _open_url(url: str, headers: dict, timeout: float = 30):
+    """Opens url like urlopen, but over a pooled keep-alive connection.
+
+    Redirects are followed, error statuses raise HTTPError and connection
+    failures raise URLError. URLs that go through a proxy use urlopen.
+    """
+    for _ in range(HTTP_MAX_REDIRECTS + 1):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or _uses_proxy(parsed):
+            with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+                yield response
+            return
+
+        # An IPv6 literal without a port would otherwise be split at its last colon
+        key = (parsed.scheme, parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80))
+        target = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        conn, response = _send_request(key, target, headers, timeout)
+
+        if response.status in HTTP_REDIRECT_CODES and response.getheader('Location'):
+            response.read()
+            if response.will_close:
+                conn.close()
+            else:
+                _http_pool.put(key, conn)
+            url = urljoin(url, response.getheader('Location'))
+            continue
+
+        if response.status >= 400:
+            conn.close()
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+
+        try:
+            yield response
+        finally:
+            # Only connections whose response was read to the end can be reused
+            if response.isclosed() and not response.will_close:
+                _http_pool.put(key, conn)
+            else:
+                conn.close()
+        return
+
+    raise URLError(f"too many redirects for {url}")
+
+def _print_progress(downloaded: int, total_size: int):
+    """Rewrites the interactive progress line of a download in place."""
+    sys.stdout.write(f"{PROGRESS_PREFIX}{downloaded * 100 / total_size:.1f}% "
+                     f"({downloaded / MIB:.1f}/{total_size / MIB:.1f} MB){PROGRESS_CLEAR_LINE}")
+    sys.stdout.flush()
+
+def _probe_range_support(url: str, headers: dict) -> Optional[int]:
+    """Returns the total size of url if the server answers range requests, otherwise None.
+
+    Failures to get an answer at all raise URLError.
+    """
+    try:
+        with _open_url(url, dict(headers, Range='bytes=0-0')) as response:
+            content_range = response.headers.get('Content-Range') or ''
+            if response.status != 206 or not content_range.startswith('bytes '):
+                return None
+            response.read()  # Drain the single byte so the connection can be reused
+            total_size = content_range.rsplit('/', 1)[-1]
+            return int(total_size) if total_size.isdigit() else None
+    except URLError:  # Includes HTTPError
+        raise
+    except (OSError, ValueError) as e:
+        raise URLError(e)
+
+def _load_download_state(state_path: str, total_size: int) -> Optional[List[List[int]]]:
+    """Returns the completed [start, end) ranges of a parallel download, or None if unusable."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['size'] != total_size:
+            return None
+        return [[int(start), int(end)] for start, end in state['done']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_download_state(state_path: str, total_size: int, done: List[List[int]]):
+    """Atomically records the completed ranges of a parallel download."""
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'size': total_size, 'done': sorted(done)}, f)
+    os.replace(tmp_path, state_path)
+
+def _completed_prefix(state_path: str) -> int:
+    """Returns how many leading bytes of a download its state file records as complete."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            done = sorted([int(start), int(end)] for start, end in json.load(f)['done'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+    prefix = 0
+    for start, end in done:
+        if start > prefix:
+            break
+        prefix = max(prefix, end)
+    return prefix
+
+def _missing_ranges(done: List[List[int]], total_size: int, segment_size: int) -> List[Tuple[int, int]]:
+    """Splits the byte ranges not covered by done into segments of at most segment_size."""
+    missing = []
+    pos = 0
+    for start, end in sorted(done) + [[total_size, total_size]]:
+        while pos < start:
+            segment_end = min(start, pos + segment_size)
+            missing.append((pos, segment_end))
+            pos = segment_end
+        pos = max(pos, end)
+    return missing
+
+def _preallocate(fd: int, size: int):
+    """Reserves size bytes for fd, preferring a single contiguous allocation."""
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # e.g. not supported by the filesystem
+    os.ftruncate(fd, size)
+
+def _open_preallocated(filename: str, total_size: int, resume_pos: int):
+    """Opens filename for writing at resume_pos after reserving total_size bytes for it."""
+    fd = os.open(filename, DOWNLOAD_OPEN_FLAGS, 0o644)
+    try:
+        if resume_pos == 0:
+            os.ftruncate(fd, 0)
+        _preallocate(fd, total_size)
+        f = os.fdopen(fd, 'r+b', buffering=DOWNLOAD_CHUNK_SIZE)
+    except BaseException:
+        os.close(fd)
+        raise
+    f.seek(resume_pos)
+    return f
+
+def _fetch_ranges(url: str, headers: dict, fd: int, ranges: List[Tuple[int, int]],
+                  total_size: int, done: List[List[int]], state_path: str, is_interactive: bool):
+    """Downloads the given byte ranges concurrently, writing each one in place with os.pwrite."""
+    lock = threading.Lock()
+    stop = threading.Event()
+    downloaded = [total_size - sum(end - start for start, end in ranges)]
+
+    def fetch(start: int, end: int):
+        with _open_url(url, dict(headers, Range=f'bytes={start}-{end - 1}')) as response:
+            if response.status != 206:
+                raise RuntimeError("Server ignored the range request.")
+            # One reusable buffer per connection instead of a new bytes object per chunk
+            buffer = memoryview(bytearray(DOWNLOAD_CHUNK_SIZE))
+            offset = start
+            while offset < end:
+                if stop.is_set() or _shutdown_requested.is_set():
+                    raise KeyboardInterrupt
+                received = response.readinto(buffer[:min(DOWNLOAD_CHUNK_SIZE, end - offset)])
+                if not received:
+                    raise URLError(f"connection closed at byte {offset}")
+                view = buffer[:received]
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    view = view[written:]
+                    offset += written
+                with lock:
+                    downloaded[0] += received
+        with lock:
+            done.append([start, end])
+            _save_download_state(state_path, total_size, done)
+
+    with ThreadPoolExecutor(max_workers=PARALLEL_DOWNLOAD_CONNECTIONS) as executor:
+        futures = [executor.submit(fetch, start, end) for start, end in ranges]
+        try:
+            not_done = set(futures)
+            while not_done:
+                finished, not_done = wait(not_done, timeout=PROGRESS_INTERVAL,
+                                         return_when=FIRST_EXCEPTION)
+                for future in finished:
+                    future.result()  # Re-raises the first failed range
+                if is_interactive:
+                    _print_progress(downloaded[0], total_size)
+        except BaseException:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            raise
+
+def _download_in_parallel(url: str, filename: str, headers: dict, is_interactive: bool) -> bool:
+    """Downloads url over several connections. Returns False if a single stream should be used."""
+    state_path = filename + DOWNLOAD_STATE_SUFFIX
+    has_state = os.path.exists(state_path)
+
+    # Partial files without a state file are resumed by the single-stream path
+    if not hasattr(os, 'pwrite') or (os.path.exists(filename) and not has_state):
+        return False
+
+    try:
+        total_size = _probe_range_support(url, headers)
+    except URLError:
+        if has_state:
+            raise  # Only a definite answer may discard the partial download
+        total_size = None  # The single stream reports the failure
+    done = _load_download_state(state_path, total_size) if has_state and total_size else None
+
+    if done is None:
+        if has_state:
+            # The preallocated file tells nothing about what was downloaded, start over
+            for path in (state_path, filename):
+                if os.path.exists(path):
+                    os.remove(path)
+        if not total_size or total_size < PARALLEL_DOWNLOAD_MIN_SIZE:
+            return False
+        done = []
+
+    ranges = _missing_ranges(done, total_size, PARALLEL_SEGMENT_SIZE)
+    connections = min(PARALLEL_DOWNLOAD_CONNECTIONS, len(ranges))
+    if done:
+        print(f"   Resuming parallel download for {filename} ({len(ranges)} segment(s) left)...")
+    elif not is_interactive:
+        print(f"   Downloading {filename} over {connections} connections...")
+
+    fd = os.open(filename, DOWNLOAD_OPEN_FLAGS, 0o644)
+    try:
+        if not done:
+            _preallocate(fd, total_size)
+            _save_download_state(state_path, total_size, done)
+        _fetch_ranges(url, headers, fd, ranges, total_size, done, state_path, is_interactive)
+    finally:
+        os.close(fd)
+
+    os.remove(state_path)
+    if is_interactive:
+        print()  # New line after progress
+    else:
+        print(f"   Download complete: {filename}")
+    return True
+
+def download_with_python(url: str, filename: str, expected_hash: Optional[str] = None) -> Optional[str]:
+    """Native Python downloader with resume support using keep-alive HTTP connections.
+
+    Files of at least PARALLEL_DOWNLOAD_MIN_SIZE bytes are fetched with
+    concurrent range requests when the server supports them.
+
+    Returns:
+        The hex digest of the file, hashed with the algorithm of expected_hash
+        while it was written, or None if it could not be computed on the fly.
+    """
+
+    is_interactive = sys.stdout.isatty()
+    headers = {'User-Agent': 'rpip/1.0'}
 
     try:
+        if _download_in_parallel(url, filename, headers, is_interactive):
+            return None  # Ranges arrive out of order, the file is hashed afterwards
+
+        # Check if file exists and get its size for resume; the size of a
+        # preallocated file says nothing, its state file knows the completed prefix
+        resume_pos = 0
+        mode = 'wb'
+        if os.path.exists(filename):
+            state_path = filename + DOWNLOAD_STATE_SUFFIX
+            if os.path.exists(state_path):
+                resume_pos = _completed_prefix(state_path)
+            else:
+                resume_pos = os.path.getsize(filename)
+        if resume_pos > 0:
+            mode = 'ab'
+            if is_interactive:
+                print(f"   Resuming from byte {resume_pos}")
+            else:
+                print(f"   Resuming download for {filename} from byte {resume_pos}...")
+
         if not is_interactive:
             print(f"   Downloading {filename}...")
 
-        # Create request with Range header for resume support
-        headers = {'User-Agent': 'rpip/1.0'}
+        # Add Range header for resume support
         if resume_pos > 0:
             headers['Range'] = f'bytes={resume_pos}-'
 
-        req = Request(url, headers=headers)
-
-        with urlopen(req, timeout=30) as response:
+        with _open_url(url, headers) as response:
             # Get total file size
             if resume_pos > 0:
                 # For resumed downloads, Content-Range header tells us the total
@@ -124,34 +899,81 @@ def download_with_python(url: str, filename: str):
             else:
                 total_size = int(response.headers.get('Content-Length', 0))
 
+            # Hash while downloading, so the file does not have to be read back
+            hasher = _new_hasher(_parse_hash(expected_hash)[0]) if expected_hash else None
+            if hasher and resume_pos > 0:
+                _hash_file(hasher, filename, resume_pos)
+
             # Download with progress indication
             downloaded = resume_pos
-            chunk_size = 8192
-
-            with open(filename, mode) as f:
-                while True:
-                    chunk = response.read(chunk_size)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    downloaded += len(chunk)
-
-                    # Show progress only if interactive
-                    if is_interactive and total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        mb_downloaded = downloaded / (1024 * 1024)
-                        mb_total = total_size / (1024 * 1024)
-                        print(f"\r   Progress: {percent:.1f}% ({mb_downloaded:.1f}/{mb_total:.1f} MB)", end='', flush=True)
-
+            show_progress = is_interactive and total_size > 0
+            last_progress = 0.0
+
+            # Reusable receive buffer: no per-chunk allocation, and the file writer
+            # and hasher both consume the memoryview without copying it
+            buffer = memoryview(bytearray(DOWNLOAD_CHUNK_SIZE))
+
+            # With a known size the whole file is allocated up front. Its size then no
+            # longer tells how much arrived, so the state file records the completed
+            # prefix, which also lets the parallel path resume it
+            state_path = filename + DOWNLOAD_STATE_SUFFIX if total_size > 0 else None
+            last_state_save = time.monotonic()
+            if state_path:
+                f = _open_preallocated(filename, total_size, resume_pos)
+                _save_download_state(state_path, total_size, [[0, resume_pos]])
+            else:
+                if os.path.exists(filename + DOWNLOAD_STATE_SUFFIX):
+                    os.remove(filename + DOWNLOAD_STATE_SUFFIX)
+                f = open(filename, mode, buffering=DOWNLOAD_CHUNK_SIZE)
+
+            with f:
+                try:
+                    while True:
+                        if _shutdown_requested.is_set():
+                            raise KeyboardInterrupt
+                        received = response.readinto(buffer)
+                        if not received:
+                            break
+                        chunk = buffer[:received]
+                        f.write(chunk)
+                        if hasher:
+                            hasher.update(chunk)
+                        downloaded += received
+
+                        # Show progress only if interactive, at most every PROGRESS_INTERVAL
+                        now = time.monotonic()
+                        if show_progress and now - last_progress >= PROGRESS_INTERVAL:
+                            _print_progress(downloaded, total_size)
+                            last_progress = now
+                        if state_path and now - last_state_save >= DOWNLOAD_STATE_INTERVAL:
+                            f.flush()
+                            _save_download_state(state_path, total_size, [[0, downloaded]])
+                            last_state_save = now
+
+                    if state_path and downloaded < total_size:
+                        raise http.client.IncompleteRead(b'', total_size - downloaded)
+                except BaseException:
+                    if state_path:
+                        f.flush()
+                        _save_download_state(state_path, total_size, [[0, downloaded]])
+                    raise
+
+            if state_path:
+                os.remove(state_path)
+
+            if show_progress:
+                _print_progress(downloaded, total_size)
             if is_interactive:
                 print()  # New line after progress
             else:
                 print(f"   Download complete: {filename}")
 
+            return hasher.hexdigest() if hasher else None
+
     except HTTPError as e:
         if e.code == 416:  # Range Not Satisfiable - file already complete
             print("   File already complete!")
-            return
+            return None
         print(f"\n❌ HTTP Error {e.code}: {e.reason}", file=sys.stderr)
         print(f"   Run the same command again to RESUME the download.", file=sys.stderr)
         sys.exit(1)
@@ -167,11 +989,19 @@ def download_with_python(url: str, filename: str):
         print(f"   Run the same command again to RESUME the download.", file=sys.stderr)
         sys.exit(1)
 
-def download_resumable(url: str, filename: str, downloader: str):
-    """Executes the downloader (external tool or Python) with resume flags."""
+def download_resumable(url: str, filename: str, downloader: str,
+                       expected_hash: Optional[str] = None) -> Optional[str]:
+    """Executes the downloader (external tool or Python) with resume flags.
+
+    Returns the digest computed during the download (Python downloader only), or None.
+    """
 
     is_interactive = sys.stdout.isatty()
 
+    # Parallel downloads preallocate the file, only the Python downloader can resume them
+    if downloader != "python" and os.path.exists(filename + DOWNLOAD_STATE_SUFFIX):
+        downloader = "python"
+
     print(f"⬇️  Starting resumable download via {downloader}...")
     if is_interactive:
         print(f"   Target URL: {url}")
@@ -179,8 +1009,7 @@ def download_resumable(url: str, filename: str, downloader: str):
 
     # Use native Python downloader
     if downloader == "python":
-        download_with_python(url, filename)
-        return
+        return download_with_python(url, filename, expected_hash)
 
     # Base commands for external downloaders
     if downloader == "aria2c":
@@ -197,7 +1026,7 @@ def download_resumable(url: str, filename: str, downloader: str):
             cmd.extend(["-s", "-S"])  # Silent but show errors
 
     try:
-        subprocess.run(cmd, check=True)
+        _run_subprocess(cmd)
         if not is_interactive:
             print(f"   Download complete: {filename}")
     except subprocess.CalledProcessError as e:
@@ -205,37 +1034,154 @@ def download_resumable(url: str, filename: str, downloader: str):
         print(f"   Run the same command again to RESUME the download.", file=sys.stderr)
         sys.exit(1)
         
-def verify_file_hash(filename: str, expected_hash: Optional[str]) -> bool:
-    """Verifies the SHA256 hash of the downloaded file if hash is provided."""
+def download_batch_with_aria2c(resolutions: List[Tuple[str, str, Optional[str]]]) -> Set[str]:
+    """Downloads and checksums all (url, filename, hash) entries with a single aria2c run.
+
+    Returns the filenames downloaded and verified by aria2c, which is empty if
+    the run failed. Other files are left for the per-package path to resume and verify.
+    """
+    entries = {}
+    for url, filename, file_hash in resolutions:
+        # Files preallocated by the Python downloader can only be resumed by it
+        if not os.path.exists(filename + DOWNLOAD_STATE_SUFFIX):
+            entries.setdefault(filename, (url, file_hash))
+    if not entries:
+        return set()
+
+    print(f"⬇️  Downloading {len(entries)} package(s) in one aria2c batch...")
+
+    unverified = set()
+    fd, input_file = tempfile.mkstemp(prefix='rpip-', suffix='.aria2-input')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for filename, (url, file_hash) in entries.items():
+                f.write(f"{url}\n  out={filename}\n")
+                if file_hash:
+                    algorithm, hash_value = _parse_hash(file_hash)
+                    if algorithm in ARIA2C_CHECKSUM_NAMES:
+                        f.write(f"  checksum={ARIA2C_CHECKSUM_NAMES[algorithm]}={hash_value}\n")
+                    else:
+                        unverified.add(filename)
+
+        cmd = ["aria2c", "-i", input_file, "-d", os.getcwd(),
+               "-j", str(MAX_PARALLEL_INSTALLS),
+               "-x", str(ARIA2C_CONNECTIONS_PER_FILE), "-s", str(ARIA2C_CONNECTIONS_PER_FILE),
+               "--continue=true", "--check-integrity=true"]
+        if not sys.stdout.isatty():
+            cmd.extend(["--summary-interval=0", "--quiet=true"])
+
+        _run_subprocess(cmd)
+        print("✅ Batch download complete.\n")
+        return set(entries) - unverified
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  aria2c batch download failed with exit code {e.returncode}, "
+              f"downloading packages one at a time.\n", file=sys.stderr)
+        return set()
+    finally:
+        os.remove(input_file)
+
+def _drop_page_cache(filename: str):
+    """Tells the kernel the cached pages of a file are no longer needed (POSIX only)."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _hash_file(hasher, filename: str, length: Optional[int] = None):
+    """Feeds the first length bytes (default: all) of a file to hasher.
+
+    The file is memory-mapped so hashlib digests it in a single call with the
+    GIL released, instead of one Python-level call per chunk. Files that are
+    too large or cannot be mapped are read into one reused buffer instead.
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size if length is None else length
+        if size == 0:
+            return  # Empty files cannot be mapped
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass  # Only a read-ahead hint
+        if size <= MMAP_MAX_SIZE:
+            try:
+                mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            except OSError:
+                mm = None  # e.g. a filesystem without mmap support
+            if mm is not None:
+                with mm:
+                    if hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    hasher.update(mm)
+                return
+
+        buffer = memoryview(bytearray(min(HASH_FALLBACK_CHUNK_SIZE, size)))
+        remaining = size
+        while remaining:
+            read = f.readinto(buffer[:min(len(buffer), remaining)])
+            if not read:
+                break
+            hasher.update(buffer[:read])
+            remaining -= read
+
+def _parse_hash(expected_hash: str) -> Tuple[str, str]:
+    """Splits a hash like 'sha256=...' into (algorithm, value); bare values are SHA256."""
+    if '=' in expected_hash:
+        algorithm, hash_value = expected_hash.split('=', 1)
+        return algorithm, hash_value
+    return 'sha256', expected_hash
+
+def _new_hasher(algorithm: str):
+    """Returns a new hashlib object for a supported algorithm, or None."""
+    if algorithm == 'sha256':
+        return hashlib.sha256()
+    elif algorithm == 'sha512':
+        return hashlib.sha512()
+    elif algorithm == 'md5':
+        return hashlib.md5()
+    elif algorithm == 'blake2b':
+        return hashlib.blake2b()
+    elif algorithm == 'blake2s':
+        return hashlib.blake2s()
+    return None
+
+def verify_file_hash(filename: str, expected_hash: Optional[str],
+                     computed_hash: Optional[str] = None) -> bool:
+    """Verifies the SHA256 hash of the downloaded file if hash is provided.
+
+    If computed_hash is given (the digest calculated while downloading), it is
+    compared directly instead of reading the file again.
+    """
     if not expected_hash:
         print("⚠️  No hash provided, skipping integrity check.")
         return True
 
     # Parse hash format (usually "sha256=...")
-    if '=' in expected_hash:
-        algorithm, hash_value = expected_hash.split('=', 1)
-    else:
-        algorithm = 'sha256'
-        hash_value = expected_hash
+    algorithm, hash_value = _parse_hash(expected_hash)
 
     print(f"🔐 Verifying file integrity ({algorithm})...")
 
     try:
-        if algorithm == 'sha256':
-            hasher = hashlib.sha256()
-        elif algorithm == 'sha512':
-            hasher = hashlib.sha512()
-        elif algorithm == 'md5':
-            hasher = hashlib.md5()
-        else:
-            print(f"⚠️  Unsupported hash algorithm: {algorithm}, skipping verification.", file=sys.stderr)
-            return True
+        if computed_hash is None:
+            hasher = _new_hasher(algorithm)
+            if hasher is None:
+                print(f"⚠️  Unsupported hash algorithm: {algorithm}, skipping verification.", file=sys.stderr)
+                return True
 
-        with open(filename, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                hasher.update(chunk)
+            if not os.path.isfile(filename):
+                print(f"❌ File not found: {filename}", file=sys.stderr)
+                return False
 
-        computed_hash = hasher.hexdigest()
+            _hash_file(hasher, filename)
+            computed_hash = hasher.hexdigest()
 
         if computed_hash == hash_value:
             print("✅ File integrity verified.")
@@ -253,16 +1199,100 @@ def verify_file_hash(filename: str, expected_hash: Optional[str]) -> bool:
         print(f"⚠️  Error during hash verification: {e}", file=sys.stderr)
         return False
 
+def _download_record_path(url: str) -> str:
+    """Returns the cache file describing the verified download of a URL."""
+    return os.path.join(DOWNLOAD_CACHE_DIR, f"{hashlib.sha256(url.encode()).hexdigest()}.json")
+
+def _record_download(url: str, filename: str, file_hash: Optional[str]):
+    """Atomically records the size and hash of a verified download."""
+    if not file_hash or not _cache_enabled():
+        return
+
+    try:
+        size = os.path.getsize(filename)
+        os.makedirs(DOWNLOAD_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=DOWNLOAD_CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'filename': filename, 'size': size, 'hash': file_hash}, f)
+            os.replace(tmp_path, _download_record_path(url))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass  # The cache is an optimization only
+
+def _is_downloaded(url: str, filename: str, file_hash: Optional[str]) -> bool:
+    """Returns True if filename already holds the complete, verified download of url.
+
+    Only files with a matching download record are hashed; anything else is left to
+    the download, which resumes it or verifies it once the server reports it complete.
+    """
+    if not file_hash or not _cache_enabled() or not os.path.isfile(filename) \
+            or os.path.exists(filename + DOWNLOAD_STATE_SUFFIX):
+        return False
+
+    try:
+        with open(_download_record_path(url), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        if record.get('size') != os.path.getsize(filename) or record.get('hash') != file_hash:
+            return False
+    except (OSError, ValueError, AttributeError):
+        return False
+
+    algorithm, hash_value = _parse_hash(file_hash)
+    hasher = _new_hasher(algorithm)
+    if hasher is None:
+        return False
+
+    try:
+        _hash_file(hasher, filename)
+    except (OSError, ValueError):
+        return False
+    return hasher.hexdigest() == hash_value
+
+def _load_pip_main():
+    """Returns pip's in-process entry point, or None if pip has to run as a subprocess.
+
+    Only pip's importlib metadata backend (the default from Python 3.11) sees packages
+    installed by an earlier call in the same process; the pkg_resources backend caches
+    its working set, so a package would not find the dependencies installed before it.
+    """
+    try:
+        from pip._internal.cli.main import main as pip_main
+        from pip._internal.metadata import _should_use_importlib_metadata
+    except ImportError:
+        return None
+    return pip_main if _should_use_importlib_metadata() else None
+
+def _run_pip_install(pip_args: List[str], in_process: bool = True):
+    """Runs 'pip install' with the given arguments, raising CalledProcessError on failure.
+
+    pip runs in this process when possible, so its modules are imported once for
+    all installs instead of once per package.
+    """
+    pip_main = _load_pip_main() if in_process else None
+    if pip_main is None:
+        _run_subprocess([sys.executable, "-m", "pip", "install"] + pip_args)
+        return
+
+    try:
+        returncode = pip_main(["install"] + pip_args)
+    except SystemExit as e:
+        returncode = e.code
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, ["pip", "install"] + pip_args)
+
 def install_package(filename: str, install_args: List[str]) -> bool:
     """Installs the downloaded wheel file using pip. Returns True if successful."""
 
     print("📦 Download complete. Installing via pip...")
 
-    # Construct the final pip install command
-    final_cmd = [sys.executable, "-m", "pip", "install", filename] + install_args
+    # pip replacing itself must not run inside the process that has it imported
+    is_pip_itself = _normalize_name(os.path.basename(filename).split('-', 1)[0]) == 'pip'
 
     try:
-        subprocess.run(final_cmd, check=True)
+        _run_pip_install([filename] + install_args, in_process=not is_pip_itself)
         print("✅ Installation successful!")
         return True
     except subprocess.CalledProcessError as e:
@@ -278,6 +1308,53 @@ def cleanup(filename: str):
     except OSError as e:
         print(f"⚠️ Warning: Could not remove file {filename}: {e}", file=sys.stderr)
 
+def _open_nested_requirements(path: str) -> Optional[TextIO]:
+    """Open a nested requirements file, or return None if there is no such file."""
+    if not os.path.isfile(path):
+        return None
+    return open(path, 'r', encoding='utf-8')
+
+def _parse_requirements_stream(stream: TextIO, base_dir: str,
+                               opener: Callable[[str], Optional[TextIO]] = _open_nested_requirements
+                               ) -> Tuple[List[str], List[str]]:
+    """Parse requirements read from stream and return packages and pip options.
+
+    Nested -r paths are taken relative to base_dir and opened with opener,
+    which returns None for a missing file.
+    """
+    packages = []
+    pip_options = []
+
+    for match in REQUIREMENTS_LINE_RE.finditer(stream.read()):
+        kind = match.lastgroup
+
+        # Handle -r for nested requirements (recursive)
+        if kind == 'nested':
+            # Resolve relative path
+            nested_path = os.path.join(base_dir, match.group('nested'))
+            nested = opener(nested_path)
+            if nested is None:
+                print(f"⚠️  Warning: Nested requirements file not found: {nested_path}", file=sys.stderr)
+                continue
+            with nested:
+                nested_packages, nested_options = _parse_requirements_stream(
+                    nested, os.path.dirname(nested_path), opener)
+            packages.extend(nested_packages)
+            pip_options.extend(nested_options)
+
+        # Editable installs are kept alongside regular packages
+        elif kind in ('editable', 'package'):
+            packages.append(match.group(kind))
+
+        # Keep pip options we should preserve; other options are skipped
+        elif kind == 'option':
+            option = match.group('option')
+            head = option.split('=', 1)[0].split(None, 1)[0]
+            if head in PRESERVED_OPTIONS:
+                pip_options.append(option)
+
+    return packages, pip_options
+
 def parse_requirements_file(filepath: str) -> Tuple[List[str], List[str]]:
     """Parse a requirements file and return packages and pip options.
 
@@ -286,93 +1363,26 @@ def parse_requirements_file(filepath: str) -> Tuple[List[str], List[str]]:
         - packages: List of package specs (including editable installs)
         - pip_options: List of pip options to apply globally (--index-url, etc.)
     """
-    packages = []
-    pip_options = []
-
-    # Pip options that should be preserved
-    PRESERVED_OPTIONS = [
-        '--index-url', '--extra-index-url', '--trusted-host',
-        '--find-links', '--no-index', '--prefer-binary',
-        '--pre', '--no-binary', '--only-binary'
-    ]
-
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                # Strip whitespace
-                line = line.strip()
-
-                # Skip empty lines
-                if not line:
-                    continue
-
-                # Strip comments (but not # in URLs like git+https://...#egg=package)
-                # Only strip # if it's preceded by whitespace or at start of line
-                if ' #' in line:
-                    line = line[:line.index(' #')].strip()
-                elif line.startswith('#'):
-                    continue
-
-                # Handle -r for nested requirements (recursive)
-                if line.startswith('-r') or line.startswith('--requirement'):
-                    nested_file = line.split(None, 1)[1] if ' ' in line else line[2:].strip()
-                    # Resolve relative path
-                    nested_path = os.path.join(os.path.dirname(filepath), nested_file)
-                    if os.path.exists(nested_path):
-                        nested_packages, nested_options = parse_requirements_file(nested_path)
-                        packages.extend(nested_packages)
-                        pip_options.extend(nested_options)
-                    else:
-                        print(f"⚠️  Warning: Nested requirements file not found: {nested_path}", file=sys.stderr)
-                    continue
-
-                # Handle -e for editable installs (include them)
-                if line.startswith('-e ') or line.startswith('--editable'):
-                    packages.append(line)
-                    continue
-
-                # Check if this is a pip option we should preserve
-                is_preserved_option = False
-                for opt in PRESERVED_OPTIONS:
-                    if line.startswith(opt):
-                        pip_options.append(line)
-                        is_preserved_option = True
-                        break
-
-                if is_preserved_option:
-                    continue
-
-                # Skip other pip options that start with dash
-                if line.startswith('-'):
-                    continue
-
-                # Add regular packages
-                packages.append(line)
-
+            return _parse_requirements_stream(f, os.path.dirname(filepath))
     except FileNotFoundError:
         raise RuntimeError(f"Requirements file not found: {filepath}")
     except Exception as e:
         raise RuntimeError(f"Error reading requirements file: {e}")
 
-    return packages, pip_options
-
+@lru_cache(maxsize=4096)
 def is_editable_install(package_spec: str) -> bool:
     """Check if a package spec is an editable install."""
-    return package_spec.startswith('-e ') or package_spec.startswith('--editable')
+    return package_spec.startswith(('-e ', '-e\t', '--editable'))
 
 def install_editable_package(package_spec: str, install_args: List[str]) -> bool:
     """Install an editable package directly via pip (no download needed). Returns True if successful."""
     print(f"📝 Installing editable package: {package_spec}")
 
     # Parse the package spec to get the actual path/URL
-    if package_spec.startswith('-e '):
-        editable_spec = package_spec[3:].strip()
-    elif package_spec.startswith('--editable '):
-        editable_spec = package_spec[11:].strip()
-    elif package_spec.startswith('--editable='):
-        editable_spec = package_spec[11:].strip()
-    else:
-        editable_spec = package_spec
+    match = EDITABLE_RE.match(package_spec)
+    editable_spec = match.group(1) if match else package_spec
 
     print(f"   Source: {editable_spec}")
 
@@ -380,45 +1390,79 @@ def install_editable_package(package_spec: str, install_args: List[str]) -> bool
     cmd = [sys.executable, "-m", "pip", "install", "-e", editable_spec] + install_args
 
     try:
-        subprocess.run(cmd, check=True)
+        _run_subprocess(cmd)
         print("✅ Editable package installed successfully!")
         return True
     except subprocess.CalledProcessError as e:
         print(f"\n⚠️  Editable install failed with exit code {e.returncode}.", file=sys.stderr)
         return False
 
-def install_single_package(package_spec: str, install_args: List[str], downloader: str) -> bool:
-    """Install a single package with resumable download. Returns True if successful."""
+def install_single_package(package_spec: str, install_args: List[str], downloader: str,
+                           resolved: Optional[Tuple[str, str, Optional[str]]] = None,
+                           prefetched: bool = False) -> bool:
+    """Install a single package with resumable download. Returns True if successful.
+
+    If resolved is given it is used as the (url, filename, hash) of the package
+    instead of running resolve_package again. If prefetched is True the file was
+    already downloaded and verified (by the aria2c batch) and is installed as is.
+    """
     try:
         # Check if this is an editable install
         if is_editable_install(package_spec):
-            return install_editable_package(package_spec, install_args)
+            return _run_install(install_editable_package, package_spec, install_args)
 
         # Regular package installation with resumable download
         # Resolve URL and hash
-        url, filename, file_hash = resolve_package(package_spec)
-
-        # Download Resumable
-        download_resumable(url, filename, downloader)
+        url, filename, file_hash = resolved or resolve_package(package_spec)
+
+        with _download_lock(filename):
+            if prefetched:
+                print(f"📥 Downloaded and verified by aria2c: {filename}")
+            # A wheel kept by an earlier failed install is installed as is
+            elif _is_downloaded(url, filename, file_hash):
+                print(f"♻️  Reusing verified download: {filename}")
+            else:
+                # Download Resumable (hashing on the fly when possible)
+                computed_hash = download_resumable(url, filename, downloader, file_hash)
 
-        # Verify file integrity
-        if not verify_file_hash(filename, file_hash):
-            print(f"❌ File integrity check failed for {package_spec}.", file=sys.stderr)
-            return False
+                # Verify file integrity
+                if not verify_file_hash(filename, file_hash, computed_hash):
+                    print(f"❌ File integrity check failed for {package_spec}.", file=sys.stderr)
+                    return False
+                _record_download(url, filename, file_hash)
 
-        # Install Package
-        success = install_package(filename, install_args)
+            # Install Package (one at a time, downloads of other packages keep running)
+            success = _run_install(install_package, filename, install_args)
 
-        # Cleanup on success
-        if success and os.path.exists(filename):
-            cleanup(filename)
+            # Cleanup on success; a preserved wheel should not keep hogging the page cache
+            if success and os.path.exists(filename):
+                cleanup(filename)
+            else:
+                _drop_page_cache(filename)
 
-        return success
+            return success
 
     except (RuntimeError, EnvironmentError) as e:
         print(f"❌ Failed to install {package_spec}: {e}", file=sys.stderr)
         return False
 
+def _install_buffered(package_spec: str, install_args: List[str], downloader: str,
+                      resolved: Optional[Tuple[str, str, Optional[str]]], prefetched: bool = False):
+    """Runs install_single_package in a worker thread, buffering everything it prints.
+
+    Returns:
+        Tuple of (success, output_chunks, error) where error is the exception
+        (e.g. SystemExit from a failed download) that aborted the task, if any.
+    """
+    chunks = []
+    _task_output.chunks = chunks
+    try:
+        return install_single_package(package_spec, install_args, downloader, resolved, prefetched), chunks, None
+    except BaseException as e:  # sys.exit() in a worker must still reach the main thread
+        return False, chunks, e
+    finally:
+        _task_output.chunks = None
+
 
 # --- Main Logic ---
 
@@ -477,18 +1521,60 @@ def main():
 
             failed_packages = []
             successful_count = 0
-
-            for idx, package in enumerate(packages, 1):
-                print(f"\n{'='*60}")
-                print(f"[{idx}/{len(packages)}] Installing: {package}")
-                print(f"{'='*60}")
-
-                if install_single_package(package, combined_args, downloader):
-                    successful_count += 1
-                    print(f"✅ [{idx}/{len(packages)}] Successfully installed: {package}")
-                else:
-                    failed_packages.append(package)
-                    print(f"❌ [{idx}/{len(packages)}] Failed to install: {package}")
+            aborted = None
+
+            # Resolve everything with one pip run; unmatched specs are resolved per package
+            resolutions = resolve_packages([p for p in packages if not is_editable_install(p)])
+
+            # aria2c fetches every resolved package in one run instead of one process per file
+            prefetched = set()
+            if downloader == "aria2c":
+                fetched = download_batch_with_aria2c(list(resolutions.values()))
+                prefetched = {spec for spec, (_, filename, _) in resolutions.items() if filename in fetched}
+
+            # Download concurrently while the installer thread installs finished downloads
+            _shutdown_requested.clear()
+            workers = min(MAX_PARALLEL_INSTALLS, len(packages))
+            with _buffered_output(), _installer_thread(), ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_install_buffered, package, combined_args, downloader,
+                                    resolutions.get(package), package in prefetched): (idx, package)
+                    for idx, package in enumerate(packages, 1)
+                }
+                try:
+                    for future in as_completed(futures):
+                        idx, package = futures[future]
+                        success, chunks, error = future.result()
+
+                        print(f"\n{'='*60}")
+                        print(f"[{idx}/{len(packages)}] Installing: {package}")
+                        print(f"{'='*60}")
+                        _replay_output(chunks)
+
+                        if error is not None:
+                            # A download aborted the run; finish what is running, skip the rest
+                            if aborted is None:
+                                aborted = error
+                                for pending in futures:
+                                    pending.cancel()
+                            continue
+
+                        if success:
+                            successful_count += 1
+                            print(f"✅ [{idx}/{len(packages)}] Successfully installed: {package}")
+                        else:
+                            failed_packages.append((idx, package))
+                            print(f"❌ [{idx}/{len(packages)}] Failed to install: {package}")
+                except KeyboardInterrupt:
+                    _shutdown_requested.set()
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+
+            if aborted is not None:
+                raise aborted
+
+            failed_packages = [package for _, package in sorted(failed_packages)]
 
             # Summary
             print(f"\n{'='*60}")
@@ -513,13 +1599,18 @@ def main():
                 # Resolve URL and hash
                 url, filename, file_hash = resolve_package(single_package)
 
-                # Download Resumable
-                download_resumable(url, filename, downloader)
+                # A wheel kept by an earlier failed install is installed as is
+                if _is_downloaded(url, filename, file_hash):
+                    print(f"♻️  Reusing verified download: {filename}")
+                else:
+                    # Download Resumable (hashing on the fly when possible)
+                    computed_hash = download_resumable(url, filename, downloader, file_hash)
 
-                # Verify file integrity
-                if not verify_file_hash(filename, file_hash):
-                    print("❌ File integrity check failed. Please re-download.", file=sys.stderr)
-                    sys.exit(1)
+                    # Verify file integrity
+                    if not verify_file_hash(filename, file_hash, computed_hash):
+                        print("❌ File integrity check failed. Please re-download.", file=sys.stderr)
+                        sys.exit(1)
+                    _record_download(url, filename, file_hash)
 
                 # Install Package
                 installation_successful = install_package(filename, unknown_args)
@@ -531,6 +1622,8 @@ def main():
                 # Cleanup (only if the file exists and installation was successful)
                 if filename and os.path.exists(filename) and installation_successful:
                     cleanup(filename)
+                elif filename:
+                    _drop_page_cache(filename)
 
     except (RuntimeError, EnvironmentError) as e:
         print(f"❌ {e}", file=sys.stderr)
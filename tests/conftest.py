@@ -0,0 +1,11 @@
+"""Shared pytest configuration for the rpip test suite."""
+import pathlib
+import sys
+
+# Make the checkout importable without an install, whatever pytest's import mode
+_REPO_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+# Import the module under test once, before any test module is collected
+import rpip.main  # noqa: E402,F401
@@ -67,6 +67,7 @@ def test_external_downloader_non_interactive_output():
                         with open(temp_file, 'w') as f:
                             f.write('dummy content') # Simulate a downloaded file
 
+                        check_downloader.cache_clear()
                         download_resumable(url, temp_file, check_downloader())
 
                         # Verify that subprocess.run was called with correct quiet flags
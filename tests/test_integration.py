@@ -1,331 +1,343 @@
 """Integration tests for rpip."""
 import os
 import sys
-import tempfile
-import unittest
-from unittest.mock import patch, MagicMock
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from rpip.main import install_single_package, main
-
-
-class TestInstallSinglePackage(unittest.TestCase):
-    """Integration tests for single package installation."""
-
-    @patch('rpip.main.cleanup')
-    @patch('rpip.main.install_package')
-    @patch('rpip.main.verify_file_hash')
-    @patch('rpip.main.download_resumable')
-    @patch('rpip.main.resolve_package')
-    def test_successful_installation(self, mock_resolve, mock_download,
-                                     mock_verify, mock_install, mock_cleanup):
-        """Test successful package installation flow."""
-        # Setup mocks
-        mock_resolve.return_value = ('http://example.com/pkg.whl', 'pkg.whl', 'sha256=abc123')
-        mock_verify.return_value = True
-        mock_install.return_value = True
-
-        # Run installation
-        result = install_single_package('test-package', [], 'python')
-
-        # Verify
-        self.assertTrue(result)
-        mock_resolve.assert_called_once_with('test-package')
-        mock_download.assert_called_once_with('http://example.com/pkg.whl', 'pkg.whl', 'python')
-        mock_verify.assert_called_once_with('pkg.whl', 'sha256=abc123')
-        mock_install.assert_called_once_with('pkg.whl', [])
-
-    @patch('rpip.main.cleanup')
-    @patch('rpip.main.install_package')
-    @patch('rpip.main.verify_file_hash')
-    @patch('rpip.main.download_resumable')
-    @patch('rpip.main.resolve_package')
-    def test_failed_hash_verification(self, mock_resolve, mock_download,
-                                      mock_verify, mock_install, mock_cleanup):
-        """Test installation fails when hash verification fails."""
-        # Setup mocks
-        mock_resolve.return_value = ('http://example.com/pkg.whl', 'pkg.whl', 'sha256=abc123')
-        mock_verify.return_value = False
-
-        # Run installation
-        result = install_single_package('test-package', [], 'python')
-
-        # Verify
-        self.assertFalse(result)
-        mock_install.assert_not_called()
-        mock_cleanup.assert_not_called()
-
-    @patch('rpip.main.cleanup')
-    @patch('rpip.main.install_package')
-    @patch('rpip.main.verify_file_hash')
-    @patch('rpip.main.download_resumable')
-    @patch('rpip.main.resolve_package')
-    def test_failed_installation(self, mock_resolve, mock_download,
-                                 mock_verify, mock_install, mock_cleanup):
-        """Test when package installation fails."""
-        # Setup mocks
-        mock_resolve.return_value = ('http://example.com/pkg.whl', 'pkg.whl', 'sha256=abc123')
-        mock_verify.return_value = True
-        mock_install.return_value = False
-
-        # Run installation
-        result = install_single_package('test-package', [], 'python')
-
-        # Verify
-        self.assertFalse(result)
-        mock_cleanup.assert_not_called()
-
-    @patch('rpip.main.resolve_package')
-    def test_resolve_failure(self, mock_resolve):
-        """Test when package resolution fails."""
-        # Setup mock to raise exception
-        mock_resolve.side_effect = RuntimeError('Package not found')
-
-        # Run installation
-        result = install_single_package('nonexistent-package', [], 'python')
-
-        # Verify
-        self.assertFalse(result)
-
-
-class TestMainFunction(unittest.TestCase):
-    """Integration tests for main function."""
-
-    @patch('rpip.main.cleanup')
-    @patch('rpip.main.install_package')
-    @patch('rpip.main.verify_file_hash')
-    @patch('rpip.main.download_resumable')
-    @patch('rpip.main.resolve_package')
-    @patch('rpip.main.check_downloader')
-    @patch('sys.argv', ['rpip', 'test-package'])
-    def test_main_single_package(self, mock_check_downloader, mock_resolve,
-                                 mock_download, mock_verify, mock_install, mock_cleanup):
-        """Test main function with single package."""
-        # Setup mocks
-        mock_check_downloader.return_value = 'python'
-        mock_resolve.return_value = ('http://example.com/pkg.whl', 'pkg.whl', 'sha256=abc123')
-        mock_verify.return_value = True
-        mock_install.return_value = True
-
-        # Run main (should not raise exception)
-        try:
-            main()
-        except SystemExit as e:
-            # Should exit with 0
-            self.assertEqual(e.code, 0)
-
-    @patch('rpip.main.parse_requirements_file')
-    @patch('rpip.main.install_single_package')
-    @patch('rpip.main.check_downloader')
-    @patch('sys.argv', ['rpip', '-r', 'requirements.txt'])
-    def test_main_requirements_file(self, mock_check_downloader,
-                                   mock_install_single, mock_parse):
-        """Test main function with requirements file."""
-        # Setup mocks
-        mock_check_downloader.return_value = 'python'
-        # Return tuple of (packages, pip_options)
-        mock_parse.return_value = (['package1', 'package2', 'package3'], [])
-        mock_install_single.return_value = True
-
-        # Run main
-        try:
-            main()
-        except SystemExit as e:
-            # Should exit with 0 on success
-            self.assertEqual(e.code, 0)
-
-        # Verify all packages were installed
-        self.assertEqual(mock_install_single.call_count, 3)
-
-    @patch('rpip.main.parse_requirements_file')
-    @patch('rpip.main.install_single_package')
-    @patch('rpip.main.check_downloader')
-    @patch('sys.argv', ['rpip', '-r', 'requirements.txt'])
-    def test_main_requirements_file_with_failures(self, mock_check_downloader,
-                                                  mock_install_single, mock_parse):
-        """Test main function with requirements file where some packages fail."""
-        # Setup mocks
-        mock_check_downloader.return_value = 'python'
-        # Return tuple of (packages, pip_options)
-        mock_parse.return_value = (['package1', 'package2', 'package3'], [])
-        # package2 fails
-        mock_install_single.side_effect = [True, False, True]
-
-        # Run main
-        with self.assertRaises(SystemExit) as context:
-            main()
+import threading
+from contextlib import contextmanager
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, patch
+
+import pytest
+
+import rpip.main as rpip_main
+from rpip.main import install_single_package, main, parse_requirements_file
+
+# Parsed once at import; main() gets the parsed result instead of the file
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'requirements_local.txt')
+FIXTURE_PARSED = parse_requirements_file(FIXTURE_PATH)
+
+# Command lines shared by the main() tests
+ARGV_BARE = ['rpip']
+ARGV_SINGLE = ['rpip', 'test-package']
+ARGV_REQ = ['rpip', '-r', 'requirements.txt']
+ARGV_FIXTURE = ['rpip', '-r', FIXTURE_PATH]
+
+# resolve_package() result for the single test package
+RESOLVE_RETURN = ('http://example.com/pkg.whl', 'pkg.whl', 'sha256=abc123')
+
+
+class CallRecorder:
+    """Cheap stand-in for MagicMock that only records its calls.
+
+    ``result`` is returned from every call, or called with the same
+    arguments when it is callable.
+    """
+
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if callable(self.result):
+            return self.result(*args, **kwargs)
+        return self.result
+
+
+@pytest.fixture
+def mock_rpip():
+    """Patch the resolve, download, verify, install and cleanup steps."""
+    with patch.multiple(rpip_main, cleanup=DEFAULT, install_package=DEFAULT,
+                        verify_file_hash=DEFAULT, download_resumable=DEFAULT,
+                        resolve_package=DEFAULT) as mocks:
+        yield SimpleNamespace(
+            resolve=mocks['resolve_package'],
+            download=mocks['download_resumable'],
+            verify=mocks['verify_file_hash'],
+            install=mocks['install_package'],
+            cleanup=mocks['cleanup'],
+        )
 
-        # Should exit with 1 on failure
-        self.assertEqual(context.exception.code, 1)
 
-    @patch('sys.argv', ['rpip'])
-    def test_main_no_arguments(self):
-        """Test main function with no arguments."""
-        with self.assertRaises(SystemExit) as context:
+@pytest.fixture
+def main_env(monkeypatch):
+    """Run main() on a requirements file with the Python downloader."""
+    monkeypatch.setattr(sys, 'argv', ARGV_REQ)
+    with patch.object(rpip_main, 'check_downloader', return_value='python') as check_downloader, \
+            patch.object(rpip_main, 'resolve_packages', return_value={}) as resolve_packages, \
+            patch.object(rpip_main, 'parse_requirements_file') as parse:
+        yield SimpleNamespace(check_downloader=check_downloader, resolve_packages=resolve_packages,
+                              parse=parse)
+
+
+@pytest.fixture
+def mock_install_single():
+    with patch.object(rpip_main, 'install_single_package') as mock:
+        yield mock
+
+
+@contextmanager
+def _local_patches():
+    with patch.object(sys, 'argv', ARGV_FIXTURE), \
+            patch.object(rpip_main, 'parse_requirements_file', return_value=FIXTURE_PARSED), \
+            patch.object(rpip_main, 'resolve_packages', return_value={}), \
+            patch.object(rpip_main, 'check_downloader', return_value='python'):
+        yield
+
+
+@pytest.fixture
+def local_env():
+    """Run main() on the parsed requirements_local.txt fixture."""
+    with _local_patches():
+        yield
+
+
+def _resolve_local(package_spec):
+    # Return different URLs for each package
+    pkg_name = package_spec.split('==')[0].lower()
+    return (
+        f'https://files.pythonhosted.org/packages/{pkg_name}.whl',
+        f'{pkg_name}.whl',
+        f'sha256={"a" * 64}'
+    )
+
+
+@pytest.fixture(scope='module')
+def local_run():
+    """Run main() once on requirements_local.txt, recording every step it takes."""
+    run = SimpleNamespace(
+        install_single=CallRecorder(install_single_package),
+        resolve=CallRecorder(_resolve_local),
+        download=CallRecorder(),
+        install=CallRecorder(True),
+    )
+    with _local_patches(), \
+            patch.multiple(rpip_main, install_single_package=run.install_single, resolve_package=run.resolve,
+                           download_resumable=run.download, verify_file_hash=CallRecorder(True),
+                           install_package=run.install, cleanup=CallRecorder()):
+        run.result = main()
+    return run
+
+
+# Integration tests for single package installation
+
+@pytest.mark.parametrize('verify_ret, install_ret, expected', [
+    pytest.param(True, True, True, id='success'),
+    pytest.param(False, None, False, id='failed hash verification'),
+    pytest.param(True, False, False, id='failed installation'),
+])
+def test_installation_outcomes(mock_rpip, verify_ret, install_ret, expected):
+    """Test the result of the download, verify and install steps."""
+    mock_rpip.resolve.return_value = RESOLVE_RETURN
+    mock_rpip.verify.return_value = verify_ret
+    mock_rpip.install.return_value = install_ret
+
+    result = install_single_package('test-package', [], 'python')
+
+    assert result == expected
+    mock_rpip.download.assert_called_once_with('http://example.com/pkg.whl', 'pkg.whl', 'python',
+                                               'sha256=abc123')
+    mock_rpip.verify.assert_called_once_with('pkg.whl', 'sha256=abc123', mock_rpip.download.return_value)
+    if verify_ret:
+        mock_rpip.install.assert_called_once_with('pkg.whl', [])
+    else:
+        mock_rpip.install.assert_not_called()
+    if not expected:
+        mock_rpip.cleanup.assert_not_called()
+
+
+def test_resolve_failure(mock_rpip):
+    """Test when package resolution fails."""
+    # Setup mock to raise exception
+    mock_rpip.resolve.side_effect = RuntimeError('Package not found')
+
+    # Run installation
+    result = install_single_package('nonexistent-package', [], 'python')
+
+    # Verify
+    assert not result
+    mock_rpip.download.assert_not_called()
+
+
+# Integration tests for main function
+
+def test_main_single_package(main_env, mock_rpip, monkeypatch):
+    """Test main function with single package."""
+    mock_rpip.resolve.return_value = RESOLVE_RETURN
+    mock_rpip.verify.return_value = True
+    mock_rpip.install.return_value = True
+
+    # Run main; success returns without calling sys.exit()
+    monkeypatch.setattr(sys, 'argv', ARGV_SINGLE)
+    assert main() is None
+
+
+@pytest.mark.parametrize('packages, results, expected_exit', [
+    pytest.param(['requests==2.28.0', 'numpy>=1.20.0', 'pandas'], [True, True, True], None, id='all succeed'),
+    pytest.param(['package1', 'package2', 'package3'], [True, False, True], 1, id='one fails'),
+])
+def test_main_requirements_file_outcomes(main_env, mock_install_single, packages, results, expected_exit):
+    """Test main function with requirements file where packages succeed or fail."""
+    main_env.parse.return_value = (packages, [])
+    mock_install_single.side_effect = results
+
+    if expected_exit is None:
+        main()
+    else:
+        with pytest.raises(SystemExit) as context:
             main()
-        # Should exit with 1
-        self.assertEqual(context.exception.code, 1)
-
-
-class TestRequirementsFileIntegration(unittest.TestCase):
-    """Integration tests for requirements file processing."""
-
-    @patch('rpip.main.install_single_package')
-    @patch('rpip.main.check_downloader')
-    def test_full_requirements_flow(self, mock_check_downloader, mock_install_single):
-        """Test complete flow of installing from requirements file."""
-        mock_check_downloader.return_value = 'python'
-        mock_install_single.return_value = True
-
-        # Create a temporary requirements file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('# Test requirements\n')
-            f.write('requests==2.28.0\n')
-            f.write('numpy>=1.20.0\n')
-            f.write('\n')
-            f.write('pandas  # for data analysis\n')
-            temp_file = f.name
-
-        try:
-            # Simulate running main with this requirements file
-            with patch('sys.argv', ['rpip', '-r', temp_file]):
-                try:
-                    main()
-                except SystemExit as e:
-                    self.assertEqual(e.code, 0)
-
-            # Verify all 3 packages were installed
-            self.assertEqual(mock_install_single.call_count, 3)
-
-            # Verify the packages that were passed
-            calls = mock_install_single.call_args_list
-            installed_packages = [call[0][0] for call in calls]
-            self.assertIn('requests==2.28.0', installed_packages)
-            self.assertIn('numpy>=1.20.0', installed_packages)
-            self.assertIn('pandas', installed_packages)
-
-        finally:
-            os.unlink(temp_file)
-
-
-class TestRequirementsLocalFile(unittest.TestCase):
-    """Test installation of specific requirements_local.txt with ML packages."""
-
-    @patch('rpip.main.install_single_package')
-    @patch('rpip.main.check_downloader')
-    def test_requirements_local_ml_packages(self, mock_check_downloader, mock_install_single):
-        """Test installing from requirements_local.txt with ML/CV packages."""
-        mock_check_downloader.return_value = 'python'
-        mock_install_single.return_value = True
-
-        # Use the fixture file
-        fixture_path = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'requirements_local.txt'
-        )
+        assert context.value.code == expected_exit
 
-        # Simulate running main with this requirements file
-        with patch('sys.argv', ['rpip', '-r', fixture_path]):
-            try:
-                main()
-            except SystemExit as e:
-                self.assertEqual(e.code, 0)
-
-        # Verify all 6 packages were installed
-        self.assertEqual(mock_install_single.call_count, 6)
-
-        # Verify the exact packages that were passed
-        calls = mock_install_single.call_args_list
-        installed_packages = [call[0][0] for call in calls]
-
-        expected_packages = [
-            'numpy==1.24.4',
-            'pandas==2.0.3',
-            'Pillow==10.1.0',
-            'opencv-python==4.9.0.80',
-            'tensorflow==2.9.0',
-            'keras==2.9.0'
-        ]
-
-        for expected_pkg in expected_packages:
-            self.assertIn(expected_pkg, installed_packages,
-                         f"Package {expected_pkg} was not installed")
-
-    @patch('rpip.main.install_single_package')
-    @patch('rpip.main.check_downloader')
-    def test_requirements_local_partial_failure(self, mock_check_downloader, mock_install_single):
-        """Test handling when some packages in requirements_local.txt fail."""
-        mock_check_downloader.return_value = 'python'
-
-        # Simulate tensorflow failing (index 4)
-        mock_install_single.side_effect = [True, True, True, True, False, True]
-
-        fixture_path = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'requirements_local.txt'
-        )
+    # Every package is attempted, failed or not
+    installed_packages = [args[0] for args, _ in mock_install_single.call_args_list]
+    assert sorted(installed_packages) == sorted(packages)
 
-        with patch('sys.argv', ['rpip', '-r', fixture_path]):
-            with self.assertRaises(SystemExit) as context:
-                main()
-
-            # Should exit with 1 on failure
-            self.assertEqual(context.exception.code, 1)
-
-        # All 6 packages should have been attempted
-        self.assertEqual(mock_install_single.call_count, 6)
-
-    @patch('rpip.main.resolve_package')
-    @patch('rpip.main.download_resumable')
-    @patch('rpip.main.verify_file_hash')
-    @patch('rpip.main.install_package')
-    @patch('rpip.main.cleanup')
-    @patch('rpip.main.check_downloader')
-    def test_requirements_local_with_actual_resolution(
-        self, mock_check_downloader, mock_cleanup, mock_install,
-        mock_verify, mock_download, mock_resolve
-    ):
-        """Test requirements_local.txt with mocked resolution and download."""
-        mock_check_downloader.return_value = 'python'
-
-        # Mock resolve_package to return different URLs for each package
-        def mock_resolve_func(package_spec):
-            pkg_name = package_spec.split('==')[0].lower()
-            return (
-                f'https://files.pythonhosted.org/packages/{pkg_name}.whl',
-                f'{pkg_name}.whl',
-                f'sha256={"a" * 64}'
-            )
-
-        mock_resolve.side_effect = mock_resolve_func
-        mock_verify.return_value = True
-        mock_install.return_value = True
-
-        fixture_path = os.path.join(
-            os.path.dirname(__file__),
-            'fixtures',
-            'requirements_local.txt'
-        )
 
-        with patch('sys.argv', ['rpip', '-r', fixture_path]):
-            try:
-                main()
-            except SystemExit as e:
-                self.assertEqual(e.code, 0)
+def test_main_requirements_file_buffers_output(main_env, mock_install_single):
+    """Test that output of parallel installs is printed as one block per package."""
+    main_env.parse.return_value = (['package1', 'package2', 'package3'], [])
+
+    def install(package_spec, install_args, downloader, resolved=None, prefetched=False):
+        print(f"output of {package_spec}")
+        return True
+
+    mock_install_single.side_effect = install
+
+    with patch.object(sys, 'stdout', new_callable=StringIO) as mock_stdout:
+        main()
+
+    output = mock_stdout.getvalue()
+    for idx, package in enumerate(['package1', 'package2', 'package3'], 1):
+        block = output.index(f"[{idx}/3] Installing: {package}")
+        line = output.index(f"output of {package}")
+        done = output.index(f"✅ [{idx}/3] Successfully installed: {package}")
+        assert block < line < done
+
+
+def test_main_requirements_file_download_aborted(main_env, mock_install_single):
+    """Test that a download calling sys.exit() in a worker aborts the whole run."""
+    main_env.parse.return_value = (['package1', 'package2'], [])
+
+    def install(package_spec, install_args, downloader, resolved=None, prefetched=False):
+        if package_spec == 'package2':
+            sys.exit(1)
+        return True
+
+    mock_install_single.side_effect = install
+
+    with pytest.raises(SystemExit) as context:
+        main()
+
+    assert context.value.code == 1
+
+
+def test_main_requirements_file_batch_resolution(main_env, mock_install_single):
+    """Test that batch-resolved packages are handed to install_single_package."""
+    main_env.parse.return_value = (['package1', '-e .', './local-package'], [])
+    resolved = ('http://example.com/package1.whl', 'package1.whl', 'sha256=abc123')
+    main_env.resolve_packages.return_value = {'package1': resolved}
+    mock_install_single.return_value = True
+
+    main()
+
+    main_env.resolve_packages.assert_called_once_with(['package1', './local-package'])
+    resolutions = {args[0]: args[3] for args, _ in mock_install_single.call_args_list}
+    assert resolutions == {'package1': resolved, '-e .': None, './local-package': None}
+
+
+def test_main_requirements_file_aria2c_batch(main_env, mock_install_single):
+    """Test that packages fetched by the aria2c batch are installed without downloading."""
+    main_env.check_downloader.return_value = 'aria2c'
+    main_env.parse.return_value = (['package1', 'package2', 'package3'], [])
+    main_env.resolve_packages.return_value = {
+        'package1': ('http://example.com/package1.whl', 'package1.whl', 'sha256=abc123'),
+        'package2': ('http://example.com/package2.whl', 'package2.whl', 'sha256=def456'),
+    }
+    mock_install_single.return_value = True
+
+    with patch.object(rpip_main, 'download_batch_with_aria2c', return_value={'package1.whl'}) as mock_batch:
+        main()
+
+    mock_batch.assert_called_once_with(list(main_env.resolve_packages.return_value.values()))
+    prefetched = {args[0]: args[4] for args, _ in mock_install_single.call_args_list}
+    assert prefetched == {'package1': True, 'package2': False, 'package3': False}
+
+
+def test_main_requirements_file_installer_thread(main_env, mock_rpip):
+    """Test that installs run on the installer thread while workers download."""
+    main_env.parse.return_value = (['package1', 'package2', 'package3'], [])
+    mock_rpip.resolve.side_effect = lambda spec: (f'http://example.com/{spec}.whl', f'{spec}.whl', None)
+    mock_rpip.verify.return_value = True
+    install_threads = []
+
+    def install(filename, install_args):
+        install_threads.append(threading.current_thread().name)
+        return True
+
+    mock_rpip.install.side_effect = install
+
+    main()
+
+    assert install_threads == ['rpip-installer'] * 3
+
+
+def test_main_no_arguments(monkeypatch):
+    """Test main function with no arguments."""
+    monkeypatch.setattr(sys, 'argv', ARGV_BARE)
+    with pytest.raises(SystemExit) as context:
+        main()
+    # Should exit with 1
+    assert context.value.code == 1
+
+
+# Installation of requirements_local.txt with ML packages
+
+def test_requirements_local_ml_packages(local_run):
+    """Test installing from requirements_local.txt with ML/CV packages."""
+    assert local_run.result is None
+
+    # Verify all 6 packages were installed
+    assert len(local_run.install_single.calls) == 6
+
+    # Verify the exact packages that were passed
+    installed_packages = [args[0] for args, _ in local_run.install_single.calls]
+
+    expected_packages = {
+        'numpy==1.24.4',
+        'pandas==2.0.3',
+        'Pillow==10.1.0',
+        'opencv-python==4.9.0.80',
+        'tensorflow==2.9.0',
+        'keras==2.9.0'
+    }
+
+    assert set(installed_packages) == expected_packages
+
+
+def test_requirements_local_partial_failure(local_env, mock_install_single):
+    """Test handling when some packages in requirements_local.txt fail."""
+    # Simulate tensorflow failing, whichever order the workers pick packages in
+    mock_install_single.side_effect = lambda package_spec, *args, **kwargs: package_spec != 'tensorflow==2.9.0'
+
+    with pytest.raises(SystemExit) as context:
+        main()
+
+    # Should exit with 1 on failure
+    assert context.value.code == 1
+
+    # All 6 packages should have been attempted
+    assert mock_install_single.call_count == 6
 
-        # Verify resolve was called for each package
-        self.assertEqual(mock_resolve.call_count, 6)
 
-        # Verify download was called for each package
-        self.assertEqual(mock_download.call_count, 6)
+def test_requirements_local_with_actual_resolution(local_run):
+    """Test requirements_local.txt with mocked resolution and download."""
+    assert local_run.result is None
 
-        # Verify install was called for each package
-        self.assertEqual(mock_install.call_count, 6)
+    # Verify resolve was called for each package
+    assert len(local_run.resolve.calls) == 6
 
+    # Verify download was called for each package
+    assert len(local_run.download.calls) == 6
 
-if __name__ == '__main__':
-    unittest.main()
+    # Verify install was called for each package
+    assert len(local_run.install.calls) == 6
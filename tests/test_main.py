@@ -1,162 +1,484 @@
 """Unit tests for rpip main module."""
 import os
+import shutil
 import sys
 import tempfile
 import unittest
 import subprocess
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch, MagicMock, mock_open
-from io import StringIO
-
-# Add parent directory to path to import rpip module
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hashlib
+import json
+import zipfile
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from urllib.error import URLError
 
 from rpip.main import (
     check_downloader,
     parse_requirements_file,
+    _parse_requirements_stream,
     verify_file_hash,
     is_editable_install,
     install_editable_package,
+    install_package,
+    resolve_package,
+    resolve_packages,
+    download_batch_with_aria2c,
+    download_with_python,
+    fast_resolve,
+    install_single_package,
+    _is_downloaded,
+    _load_pip_main,
+    _missing_ranges,
+    _open_url,
+    _record_download,
+    DOWNLOAD_STATE_SUFFIX,
     DOWNLOADER_PREFERENCE
 )
 
 
+def fake_pip_report(report):
+    """Returns a subprocess.run replacement that writes report to pip's --report file."""
+    def run(cmd, **kwargs):
+        with open(cmd[cmd.index('--report') + 1], 'w', encoding='utf-8') as f:
+            f.write(report)
+        return MagicMock(returncode=0, stdout='Would install\n')
+    return run
+
+
 class TestCheckDownloader(unittest.TestCase):
     """Test the check_downloader function."""
 
-    @patch('shutil.which')
-    def test_finds_aria2c(self, mock_which):
-        """Test that aria2c is selected when available."""
-        mock_which.side_effect = lambda x: '/usr/bin/aria2c' if x == 'aria2c' else None
-        result = check_downloader()
-        self.assertEqual(result, 'aria2c')
-
-    @patch('shutil.which')
-    def test_finds_wget(self, mock_which):
-        """Test that wget is selected when aria2c is not available."""
-        mock_which.side_effect = lambda x: '/usr/bin/wget' if x == 'wget' else None
-        result = check_downloader()
-        self.assertEqual(result, 'wget')
-
-    @patch('shutil.which')
-    def test_finds_curl(self, mock_which):
-        """Test that curl is selected when aria2c and wget are not available."""
-        mock_which.side_effect = lambda x: '/usr/bin/curl' if x == 'curl' else None
-        result = check_downloader()
-        self.assertEqual(result, 'curl')
-
-    @patch('shutil.which')
-    def test_falls_back_to_python(self, mock_which):
-        """Test that python is selected as fallback when no external tools are available."""
-        mock_which.return_value = None
-        result = check_downloader()
-        self.assertEqual(result, 'python')
+    def setUp(self):
+        check_downloader.cache_clear()
+        self.addCleanup(check_downloader.cache_clear)
+        patcher = patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop('RPIP_DOWNLOADER', None)
+        which_patcher = patch.object(shutil, 'which')
+        self.mock_which = which_patcher.start()
+        self.addCleanup(which_patcher.stop)
+
+    def test_selection_order(self):
+        """Test that the first available tool wins, falling back to python."""
+        cases = [
+            ('aria2c', '/usr/bin/aria2c'),
+            ('wget', '/usr/bin/wget'),
+            ('curl', '/usr/bin/curl'),
+            ('python', None),
+        ]
+        for tool, path in cases:
+            with self.subTest(tool=tool):
+                check_downloader.cache_clear()
+                # Only this tool is on PATH; every tool before it is missing
+                self.mock_which.side_effect = lambda x: path if x == tool else None
+                self.assertEqual(check_downloader(), tool)
+
+    def test_result_is_cached(self):
+        """Test that PATH is only probed on the first call."""
+        self.mock_which.side_effect = lambda x: '/usr/bin/wget' if x == 'wget' else None
+        self.assertEqual(check_downloader(), 'wget')
+        self.assertEqual(check_downloader(), 'wget')
+        self.assertEqual(self.mock_which.call_count, 2)
+
+    def test_env_override(self):
+        """Test that RPIP_DOWNLOADER skips probing, and rejects unknown downloaders."""
+        with patch.dict(os.environ, {'RPIP_DOWNLOADER': 'curl'}):
+            self.assertEqual(check_downloader(), 'curl')
+        self.mock_which.assert_not_called()
+
+        check_downloader.cache_clear()
+        with patch.dict(os.environ, {'RPIP_DOWNLOADER': 'axel'}):
+            with self.assertRaises(RuntimeError):
+                check_downloader()
+
+
+class TestResolvePackages(unittest.TestCase):
+    """Test the resolve_packages function."""
+
+    def setUp(self):
+        for patcher in (patch.dict(os.environ, {'RPIP_NO_CACHE': '1'}),
+                        patch('rpip.main.fast_resolve', return_value=None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    REPORT = '''{"install": [
+        {"metadata": {"name": "Requests"},
+         "download_info": {"url": "https://example.com/requests-2.28.0-py3-none-any.whl",
+                           "archive_info": {"hash": "sha256=aaa"}}},
+        {"metadata": {"name": "typing_extensions"},
+         "download_info": {"url": "https://example.com/typing_extensions-4.0.0-py3-none-any.whl"}}
+    ]}'''
+
+    @patch('subprocess.run')
+    def test_single_pip_run(self, mock_run):
+        """Test that all specs are resolved by one pip invocation and matched by name."""
+        mock_run.side_effect = fake_pip_report(self.REPORT)
+
+        result = resolve_packages(['requests==2.28.0', 'Typing-Extensions>=4', './local'])
+
+        mock_run.assert_called_once()
+        args = mock_run.call_args[0][0]
+        self.assertIn('requests==2.28.0', args)
+        self.assertIn('Typing-Extensions>=4', args)
+        self.assertNotIn('./local', args)
+        self.assertFalse(os.path.exists(args[args.index('--report') + 1]))
+        self.assertEqual(result, {
+            'requests==2.28.0': ('https://example.com/requests-2.28.0-py3-none-any.whl',
+                                 'requests-2.28.0-py3-none-any.whl', 'sha256=aaa'),
+            'Typing-Extensions>=4': ('https://example.com/typing_extensions-4.0.0-py3-none-any.whl',
+                                     'typing_extensions-4.0.0-py3-none-any.whl', None),
+        })
+
+    @patch('subprocess.run')
+    def test_resolver_error(self, mock_run):
+        """Test that a resolver error leaves every spec to per-package resolution."""
+        mock_run.side_effect = subprocess.CalledProcessError(1, 'pip', stderr='ResolutionImpossible')
+
+        result = resolve_packages(['numpy==1.0', 'numpy==2.0'])
+
+        self.assertEqual(result, {})
+
+    @patch('subprocess.run')
+    def test_nothing_to_resolve(self, mock_run):
+        """Test that pip is not run when no spec has a project name."""
+        result = resolve_packages(['./local', 'https://example.com/pkg.whl'])
+
+        self.assertEqual(result, {})
+        mock_run.assert_not_called()
+
+
+class TestResolveCache(unittest.TestCase):
+    """Test caching of pip resolution results."""
+
+    REPORT = ('{"install": [{"metadata": {"name": "requests"}, "download_info": '
+              '{"url": "https://example.com/requests-2.28.0-py3-none-any.whl", '
+              '"archive_info": {"hash": "sha256=aaa"}}}]}')
+    RESOLUTION = ('https://example.com/requests-2.28.0-py3-none-any.whl',
+                  'requests-2.28.0-py3-none-any.whl', 'sha256=aaa')
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for patcher in (patch('rpip.main.RESOLVE_CACHE_DIR', tmpdir.name),
+                        patch.dict(os.environ, {'RPIP_NO_CACHE': ''}),
+                        patch('rpip.main.fast_resolve', return_value=None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache_dir = tmpdir.name
+
+    @patch('subprocess.run')
+    def test_cache_hit_skips_pip(self, mock_run):
+        """Test that a second resolve of the same spec is served from the cache."""
+        mock_run.side_effect = fake_pip_report(self.REPORT)
+
+        self.assertEqual(resolve_package('requests==2.28.0'), self.RESOLUTION)
+        self.assertEqual(resolve_package('requests==2.28.0'), self.RESOLUTION)
+        self.assertEqual(resolve_packages(['requests==2.28.0']), {'requests==2.28.0': self.RESOLUTION})
+
+        mock_run.assert_called_once()
+
+    @patch('subprocess.run')
+    def test_expired_entry_is_ignored(self, mock_run):
+        """Test that cache entries older than the TTL trigger a new pip run."""
+        mock_run.side_effect = fake_pip_report(self.REPORT)
+        resolve_package('requests==2.28.0')
+
+        for name in os.listdir(self.cache_dir):
+            os.utime(os.path.join(self.cache_dir, name), (0, 0))
+        resolve_package('requests==2.28.0')
+
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch('subprocess.run')
+    def test_pip_config_index_is_part_of_key(self, mock_run):
+        """Test that changing the index in pip's configuration files misses the cache."""
+        mock_run.side_effect = fake_pip_report(self.REPORT)
+
+        for index_url in ('https://a.example.com/simple', 'https://b.example.com/simple'):
+            items = [('global.index-url', index_url), ('global.timeout', '60')]
+            with patch('rpip.main._load_pip_config_items', return_value=items):
+                resolve_package('requests==2.28.0')
+
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch('subprocess.run')
+    def test_no_cache_env(self, mock_run):
+        """Test that RPIP_NO_CACHE=1 bypasses the cache entirely."""
+        mock_run.side_effect = fake_pip_report(self.REPORT)
+
+        with patch.dict(os.environ, {'RPIP_NO_CACHE': '1'}):
+            resolve_package('requests==2.28.0')
+            resolve_package('requests==2.28.0')
+
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class TestFastResolve(unittest.TestCase):
+    """Test resolving exact pins through the PyPI JSON API."""
+
+    @staticmethod
+    def release(*files):
+        return json.dumps({'urls': [
+            {'packagetype': 'bdist_wheel' if filename.endswith('.whl') else 'sdist',
+             'filename': filename, 'url': f'https://files.example.com/{filename}',
+             'digests': {'sha256': digest}, 'yanked': False, 'requires_python': None}
+            for filename, digest in files
+        ]}).encode()
+
+    def fake_open_url(self, payload, requested_urls):
+        @contextmanager
+        def open_url(url, headers, timeout=30):
+            requested_urls.append(url)
+            yield BytesIO(payload)
+        return open_url
+
+    def setUp(self):
+        patcher = patch('rpip.main._uses_default_index', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_picks_compatible_wheel(self):
+        """Test that a compatible wheel is picked over incompatible wheels and the sdist."""
+        payload = self.release(('pkg-1.0.tar.gz', 'aaa'),
+                               ('pkg-1.0-cp27-cp27m-win32.whl', 'bbb'),
+                               ('pkg-1.0-py3-none-any.whl', 'ccc'))
+        requested = []
+        with patch('rpip.main._open_url', self.fake_open_url(payload, requested)):
+            result = fast_resolve('pkg==1.0')
+
+        self.assertEqual(requested, ['https://pypi.org/pypi/pkg/1.0/json'])
+        self.assertEqual(result, ('https://files.example.com/pkg-1.0-py3-none-any.whl',
+                                  'pkg-1.0-py3-none-any.whl', 'sha256=ccc'))
+
+    def test_falls_back_to_pip(self):
+        """Test that anything fast_resolve cannot answer like pip returns None."""
+        sdist_only = self.release(('pkg-1.0.tar.gz', 'aaa'))
+        with patch('rpip.main._open_url', self.fake_open_url(sdist_only, [])):
+            self.assertIsNone(fast_resolve('pkg==1.0'))
+
+        requested = []
+        with patch('rpip.main._open_url', self.fake_open_url(b'{}', requested)):
+            for spec in ('pkg>=1.0', 'pkg==1.*', 'pkg[extra]==1.0', 'pkg==1.0; python_version > "3"'):
+                self.assertIsNone(fast_resolve(spec))
+        self.assertEqual(requested, [])
+
+        with patch('rpip.main._uses_default_index', return_value=False):
+            self.assertIsNone(fast_resolve('pkg==1.0'))
+
+    @patch('subprocess.run')
+    def test_resolve_packages_skips_pip_for_pins(self, mock_run):
+        """Test that only specs fast_resolve cannot answer are passed to pip."""
+        pinned = ('https://files.example.com/a-1.0-py3-none-any.whl', 'a-1.0-py3-none-any.whl', 'sha256=aaa')
+        mock_run.side_effect = fake_pip_report('{"install": []}')
+
+        with patch('rpip.main.fast_resolve', side_effect=lambda spec: pinned if spec == 'a==1.0' else None), \
+                patch.dict(os.environ, {'RPIP_NO_CACHE': '1'}):
+            result = resolve_packages(['a==1.0', 'b==2.0', 'c>=1'])
+
+        self.assertEqual(result, {'a==1.0': pinned})
+        args = mock_run.call_args[0][0]
+        self.assertNotIn('a==1.0', args)
+        self.assertIn('b==2.0', args)
+        self.assertIn('c>=1', args)
+
+
+class TestReuseDownload(unittest.TestCase):
+    """Test reuse of wheels kept from an earlier failed install."""
+
+    URL = 'https://example.com/pkg-1.0-py3-none-any.whl'
+    CONTENT = b'wheel contents'
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for patcher in (patch('rpip.main.DOWNLOAD_CACHE_DIR', os.path.join(tmpdir.name, 'wheels')),
+                        patch.dict(os.environ, {'RPIP_NO_CACHE': ''})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.filename = os.path.join(tmpdir.name, 'pkg-1.0-py3-none-any.whl')
+        with open(self.filename, 'wb') as f:
+            f.write(self.CONTENT)
+        self.file_hash = f"sha256={hashlib.sha256(self.CONTENT).hexdigest()}"
+
+    def test_matching_file_is_reused(self):
+        """Test that a complete file with the expected hash counts as downloaded."""
+        _record_download(self.URL, self.filename, self.file_hash)
+        self.assertTrue(_is_downloaded(self.URL, self.filename, self.file_hash))
+        self.assertFalse(_is_downloaded(self.URL, self.filename, 'sha256=0000'))
+        self.assertFalse(_is_downloaded(self.URL, self.filename, None))
+
+    def test_unrecorded_file_is_not_hashed(self):
+        """Test that a file without a download record is left to the download."""
+        with patch('rpip.main._hash_file') as mock_hash_file:
+            self.assertFalse(_is_downloaded(self.URL, self.filename, self.file_hash))
+            _record_download(self.URL, self.filename, self.file_hash)
+            with patch.dict(os.environ, {'RPIP_NO_CACHE': '1'}):
+                self.assertFalse(_is_downloaded(self.URL, self.filename, self.file_hash))
+        mock_hash_file.assert_not_called()
+
+    def test_recorded_size_mismatch(self):
+        """Test that a file whose size differs from the record is not hashed."""
+        _record_download(self.URL, self.filename, self.file_hash)
+        with open(self.filename, 'ab') as f:
+            f.write(b'!')
+
+        with patch('rpip.main._hash_file') as mock_hash_file:
+            self.assertFalse(_is_downloaded(self.URL, self.filename, self.file_hash))
+        mock_hash_file.assert_not_called()
+
+    def test_partial_download_is_not_reused(self):
+        """Test that a file with a pending download state is never reused."""
+        with open(self.filename + DOWNLOAD_STATE_SUFFIX, 'w') as f:
+            f.write('{}')
+        self.assertFalse(_is_downloaded(self.URL, self.filename, self.file_hash))
+
+    @patch('rpip.main.install_package', return_value=False)
+    @patch('rpip.main.download_resumable')
+    def test_install_skips_download(self, mock_download, mock_install):
+        """Test that install_single_package installs a reusable file without downloading."""
+        resolved = (self.URL, self.filename, self.file_hash)
+        _record_download(self.URL, self.filename, self.file_hash)
+
+        self.assertFalse(install_single_package('pkg==1.0', [], 'python', resolved))
+
+        mock_download.assert_not_called()
+        mock_install.assert_called_once_with(self.filename, [])
 
 
 class TestParseRequirementsFile(unittest.TestCase):
     """Test the parse_requirements_file function."""
 
+    # Expected package lists shared by several tests
+    _EXPECTED_SIMPLE = ('requests==2.28.0', 'numpy>=1.20.0', 'pandas')
+    _EXPECTED_PAIR = ('requests==2.28.0', 'numpy>=1.20.0')
+    _EXPECTED_NESTED = ('requests==2.28.0', 'flask==2.0.0', 'numpy>=1.20.0')
+
+    @classmethod
+    def setUpClass(cls):
+        # One directory of on-disk fixtures shared by the tests that need real files
+        cls._tmpdir = tempfile.mkdtemp()
+        files = {
+            'requirements.txt': 'requests==2.28.0\n-r sub/nested.txt\nnumpy>=1.20.0\n',
+            os.path.join('sub', 'nested.txt'): '--index-url https://example.com/simple\n-r deeper.txt\n',
+            os.path.join('sub', 'deeper.txt'): 'flask==2.0.0\n',
+        }
+        os.mkdir(os.path.join(cls._tmpdir, 'sub'))
+        for name, content in files.items():
+            with open(os.path.join(cls._tmpdir, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._tmpdir)
+
     def test_parse_simple_requirements(self):
         """Test parsing a simple requirements file."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('requests==2.28.0\n')
-            f.write('numpy>=1.20.0\n')
-            f.write('pandas\n')
-            temp_file = f.name
-
-        try:
-            packages, pip_options = parse_requirements_file(temp_file)
-            self.assertEqual(packages, ['requests==2.28.0', 'numpy>=1.20.0', 'pandas'])
-            self.assertEqual(pip_options, [])
-        finally:
-            os.unlink(temp_file)
+        stream = StringIO('requests==2.28.0\nnumpy>=1.20.0\npandas\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(tuple(packages), self._EXPECTED_SIMPLE)
+        self.assertEqual(pip_options, [])
 
     def test_parse_with_comments(self):
         """Test parsing requirements file with comments."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('# This is a comment\n')
-            f.write('requests==2.28.0  # inline comment\n')
-            f.write('numpy>=1.20.0\n')
-            temp_file = f.name
-
-        try:
-            packages, pip_options = parse_requirements_file(temp_file)
-            self.assertEqual(packages, ['requests==2.28.0', 'numpy>=1.20.0'])
-            self.assertEqual(pip_options, [])
-        finally:
-            os.unlink(temp_file)
+        stream = StringIO('# This is a comment\nrequests==2.28.0  # inline comment\nnumpy>=1.20.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(tuple(packages), self._EXPECTED_PAIR)
+        self.assertEqual(pip_options, [])
 
     def test_parse_with_blank_lines(self):
         """Test parsing requirements file with blank lines."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('requests==2.28.0\n')
-            f.write('\n')
-            f.write('  \n')
-            f.write('numpy>=1.20.0\n')
-            temp_file = f.name
-
-        try:
-            packages, pip_options = parse_requirements_file(temp_file)
-            self.assertEqual(packages, ['requests==2.28.0', 'numpy>=1.20.0'])
-            self.assertEqual(pip_options, [])
-        finally:
-            os.unlink(temp_file)
+        stream = StringIO('requests==2.28.0\n\n  \nnumpy>=1.20.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(tuple(packages), self._EXPECTED_PAIR)
+        self.assertEqual(pip_options, [])
 
     def test_parse_nested_requirements(self):
         """Test parsing requirements file with nested -r."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Create nested requirements file
-            nested_file = os.path.join(tmpdir, 'nested.txt')
-            with open(nested_file, 'w') as f:
-                f.write('flask==2.0.0\n')
-
-            # Create main requirements file
-            main_file = os.path.join(tmpdir, 'requirements.txt')
-            with open(main_file, 'w') as f:
-                f.write('requests==2.28.0\n')
-                f.write('-r nested.txt\n')
-                f.write('numpy>=1.20.0\n')
-
-            packages, pip_options = parse_requirements_file(main_file)
-            self.assertEqual(packages, ['requests==2.28.0', 'flask==2.0.0', 'numpy>=1.20.0'])
-            self.assertEqual(pip_options, [])
+        files = {os.path.join('reqs', 'nested.txt'): StringIO('flask==2.0.0\n')}
+        stream = StringIO('requests==2.28.0\n-r nested.txt\nnumpy>=1.20.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, 'reqs', files.get)
+        self.assertEqual(tuple(packages), self._EXPECTED_NESTED)
+        self.assertEqual(pip_options, [])
+
+    def test_parse_missing_nested_requirements(self):
+        """Test that a missing nested -r file is skipped with a warning."""
+        stream = StringIO('requests==2.28.0\n-r missing.txt\n')
+        with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            packages, pip_options = _parse_requirements_stream(stream, '', {}.get)
+        self.assertEqual(packages, ['requests==2.28.0'])
+        self.assertIn('missing.txt', mock_stderr.getvalue())
+
+    def test_parse_nested_fixture(self):
+        """Test that nested -r files are read from disk relative to the including file."""
+        fixture = os.path.join(os.path.dirname(__file__), 'fixtures', 'requirements-nested.txt')
+        packages, pip_options = parse_requirements_file(fixture)
+        self.assertEqual(packages, ['flask==2.0.0', 'requests==2.28.0', 'numpy>=1.20.0', 'pandas',
+                                    'pytest>=7.0.0', 'sqlalchemy>=1.4.0'])
+        self.assertEqual(pip_options, [])
+
+    def test_parse_nested_on_disk(self):
+        """Test that nested files resolve relative to the file that includes them."""
+        packages, pip_options = parse_requirements_file(os.path.join(self._tmpdir, 'requirements.txt'))
+        self.assertEqual(tuple(packages), self._EXPECTED_NESTED)
+        self.assertEqual(pip_options, ['--index-url https://example.com/simple'])
 
     def test_include_editable_installs(self):
         """Test that editable installs are now included."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('requests==2.28.0\n')
-            f.write('-e git+https://github.com/user/repo.git#egg=package\n')
-            f.write('numpy>=1.20.0\n')
-            temp_file = f.name
-
-        try:
-            packages, pip_options = parse_requirements_file(temp_file)
-            self.assertEqual(packages, [
-                'requests==2.28.0',
-                '-e git+https://github.com/user/repo.git#egg=package',
-                'numpy>=1.20.0'
-            ])
-            self.assertEqual(pip_options, [])
-        finally:
-            os.unlink(temp_file)
+        stream = StringIO('requests==2.28.0\n'
+                          '-e git+https://github.com/user/repo.git#egg=package\n'
+                          'numpy>=1.20.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(packages, [
+            'requests==2.28.0',
+            '-e git+https://github.com/user/repo.git#egg=package',
+            'numpy>=1.20.0'
+        ])
+        self.assertEqual(pip_options, [])
+
+    def test_tab_separated_editable(self):
+        """Test that editable lines separated by a tab are detected and installed from their path."""
+        stream = StringIO('-e\t./pkg\n--editable\t./q\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(packages, ['-e\t./pkg', '--editable\t./q'])
+        self.assertTrue(all(is_editable_install(package) for package in packages))
+
+        with patch('rpip.main._run_subprocess') as mock_run:
+            for package in packages:
+                install_editable_package(package, [])
+        self.assertEqual([c[0][0][-1] for c in mock_run.call_args_list], ['./pkg', './q'])
 
     def test_preserve_pip_options(self):
         """Test that important pip options are preserved."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            f.write('--index-url https://pypi.org/simple\n')
-            f.write('requests==2.28.0\n')
-            f.write('--trusted-host pypi.org\n')
-            f.write('numpy>=1.20.0\n')
-            temp_file = f.name
-
-        try:
-            packages, pip_options = parse_requirements_file(temp_file)
-            self.assertEqual(packages, ['requests==2.28.0', 'numpy>=1.20.0'])
-            self.assertEqual(pip_options, [
-                '--index-url https://pypi.org/simple',
-                '--trusted-host pypi.org'
-            ])
-        finally:
-            os.unlink(temp_file)
+        stream = StringIO('--index-url https://pypi.org/simple\n'
+                          'requests==2.28.0\n'
+                          '--trusted-host pypi.org\n'
+                          'numpy>=1.20.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(tuple(packages), self._EXPECTED_PAIR)
+        self.assertEqual(pip_options, [
+            '--index-url https://pypi.org/simple',
+            '--trusted-host pypi.org'
+        ])
+
+    def test_option_matched_by_first_token(self):
+        """Test that options are preserved by their exact name, with or without '='."""
+        stream = StringIO('--extra-index-url=https://example.com/simple\n'
+                          '--pre\n'
+                          '--prefix /opt/app\n'
+                          '--require-hashes\n'
+                          'requests==2.28.0\n')
+        packages, pip_options = _parse_requirements_stream(stream, '')
+        self.assertEqual(packages, ['requests==2.28.0'])
+        self.assertEqual(pip_options, [
+            '--extra-index-url=https://example.com/simple',
+            '--pre'
+        ])
 
     def test_file_not_found(self):
         """Test that RuntimeError is raised when file is not found."""
@@ -168,52 +490,101 @@ class TestParseRequirementsFile(unittest.TestCase):
 class TestVerifyFileHash(unittest.TestCase):
     """Test the verify_file_hash function."""
 
-    def test_no_hash_provided(self):
-        """Test that verification is skipped when no hash is provided."""
+    @classmethod
+    def setUpClass(cls):
+        # The tests only read these files, so they are written once for the class
+        cls.hello_path = cls._write_temp(b'Hello, World!')
+        cls.test_path = cls._write_temp(b'Test')
+        cls.empty_path = cls._write_temp(b'')
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in (cls.hello_path, cls.test_path, cls.empty_path):
+            os.unlink(path)
+
+    @staticmethod
+    def _write_temp(data):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return path
+
+    @patch('builtins.open')
+    def test_no_hash_provided(self, mock_open_file):
+        """Test that verification is skipped, without touching the file, when no hash is provided."""
         result = verify_file_hash('dummy.whl', None)
         self.assertTrue(result)
+        mock_open_file.assert_not_called()
 
-    def test_sha256_hash_valid(self):
-        """Test SHA256 hash verification with valid hash."""
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as f:
-            f.write(b'Hello, World!')
-            temp_file = f.name
-
-        try:
+    def test_real_hashes(self):
+        """Smoke test of SHA256/SHA512 verification against real digests."""
+        cases = [
             # SHA256 of "Hello, World!"
-            expected_hash = 'sha256=dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f'
-            result = verify_file_hash(temp_file, expected_hash)
-            self.assertTrue(result)
-        finally:
-            os.unlink(temp_file)
-
-    def test_sha256_hash_invalid(self):
-        """Test SHA256 hash verification with invalid hash."""
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as f:
-            f.write(b'Hello, World!')
-            temp_file = f.name
-
-        try:
-            # Wrong hash
-            expected_hash = 'sha256=0000000000000000000000000000000000000000000000000000000000000000'
-            result = verify_file_hash(temp_file, expected_hash)
-            self.assertFalse(result)
-        finally:
-            os.unlink(temp_file)
-
-    def test_sha512_hash_valid(self):
-        """Test SHA512 hash verification with valid hash."""
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as f:
-            f.write(b'Test')
-            temp_file = f.name
-
-        try:
+            ('sha256 valid', self.hello_path,
+             'sha256=dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f', True),
+            ('sha256 invalid', self.hello_path,
+             'sha256=0000000000000000000000000000000000000000000000000000000000000000', False),
             # SHA512 of "Test"
-            expected_hash = 'sha512=c6ee9e33cf5c6715a1d148fd73f7318884b41adcb916021e2bc0e800a5c5dd97f5142178f6ae88c8fdd98e1afb0ce4c8d2c54b5f37b30b7da1997bb33b0b8a31'
-            result = verify_file_hash(temp_file, expected_hash)
-            self.assertTrue(result)
-        finally:
-            os.unlink(temp_file)
+            ('sha512 valid', self.test_path,
+             'sha512=c6ee9e33cf5c6715a1d148fd73f7318884b41adcb916021e2bc0e800a5c5dd97f5142178f6ae88c8fdd98e1afb0ce4c8d2c54b5f37b30b7da1997bb33b0b8a31',
+             True),
+            # BLAKE2b of "Hello, World!" and BLAKE2s of "Test"
+            ('blake2b valid', self.hello_path,
+             'blake2b=7dfdb888af71eae0e6a6b751e8e3413d767ef4fa52a7993daa9ef097f7aa3d949199c113caa37c94f80cf3b22f7d9d6e4f5def4ff927830cffe4857c34be3d89',
+             True),
+            ('blake2s valid', self.test_path,
+             'blake2s=bd9abbc9446fb56e8b4426d8d57287811fa1294913dd844e3cca9f3f6bc788e6', True),
+        ]
+        for name, path, expected_hash, expected in cases:
+            with self.subTest(name=name):
+                self.assertEqual(verify_file_hash(path, expected_hash), expected)
+
+    @patch('rpip.main.os.path.isfile', return_value=True)
+    @patch('rpip.main._hash_file')
+    @patch('rpip.main.hashlib')
+    def test_algorithm_routing(self, mock_hashlib, mock_hash_file, mock_isfile):
+        """Test that the hash prefix selects the digest, without hashing anything."""
+        algorithms = ('sha256', 'sha512', 'md5', 'blake2b', 'blake2s')
+        for algorithm in algorithms:
+            with self.subTest(algorithm=algorithm):
+                mock_hashlib.reset_mock()
+                hasher = getattr(mock_hashlib, algorithm).return_value
+                hasher.hexdigest.return_value = 'abc123'
+
+                self.assertTrue(verify_file_hash('pkg.whl', f'{algorithm}=abc123'))
+                self.assertFalse(verify_file_hash('pkg.whl', f'{algorithm}=def456'))
+
+                mock_hash_file.assert_called_with(hasher, 'pkg.whl')
+                others = set(algorithms) - {algorithm}
+                for other in others:
+                    getattr(mock_hashlib, other).assert_not_called()
+
+    def test_empty_file(self):
+        """Test SHA256 hash verification of an empty file, which cannot be memory-mapped."""
+        expected_hash = 'sha256=e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+        self.assertTrue(verify_file_hash(self.empty_path, expected_hash))
+
+    @unittest.skipUnless(hasattr(os, 'posix_fadvise'), 'posix_fadvise is not available')
+    def test_fadvise_failure_is_ignored(self):
+        """Test that a failing read-ahead hint does not fail verification."""
+        expected_hash = 'sha256=dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f'
+        with patch('rpip.main.os.posix_fadvise', side_effect=OSError('not supported')):
+            self.assertTrue(verify_file_hash(self.hello_path, expected_hash))
+
+    def test_unmappable_file(self):
+        """Test that a file that cannot be memory-mapped is hashed with buffered reads."""
+        expected_hash = 'sha256=dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f'
+        with patch('rpip.main.mmap.mmap', side_effect=OSError('mmap not supported')), \
+                patch('rpip.main.HASH_FALLBACK_CHUNK_SIZE', 4):
+            self.assertTrue(verify_file_hash(self.hello_path, expected_hash))
+
+    @patch('builtins.open')
+    def test_computed_hash_skips_reading(self, mock_open_file):
+        """Test that a digest computed during download is compared without reading the file."""
+        expected_hash = 'sha256=dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f'
+        self.assertTrue(verify_file_hash('pkg.whl', expected_hash, expected_hash[7:]))
+        self.assertFalse(verify_file_hash('pkg.whl', expected_hash, '0' * 64))
+        mock_open_file.assert_not_called()
 
     def test_file_not_found(self):
         """Test that verification fails when file is not found."""
@@ -222,52 +593,324 @@ class TestVerifyFileHash(unittest.TestCase):
 
     def test_unsupported_algorithm(self):
         """Test that unsupported hash algorithms are skipped."""
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as f:
-            f.write(b'Test')
-            temp_file = f.name
-
-        try:
-            result = verify_file_hash(temp_file, 'unknown=abc123')
-            self.assertTrue(result)  # Should return True when skipping
-        finally:
-            os.unlink(temp_file)
+        result = verify_file_hash(self.test_path, 'unknown=abc123')
+        self.assertTrue(result)  # Should return True when skipping
 
 
 class TestDownloadWithPython(unittest.TestCase):
-    """Test the download_with_python function."""
+    """Test the download_with_python function against a local HTTP server."""
+
+    PAYLOAD = bytes(range(256)) * 64
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(cls._tmpdir, 'file.whl'), 'wb') as f:
+            f.write(cls.PAYLOAD)
 
-    @patch('urllib.request.urlopen')
-    @patch('os.path.exists')
-    def test_fresh_download(self, mock_exists, mock_urlopen):
+        class Handler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=cls._tmpdir))
+        # A short poll interval keeps shutdown() in tearDownClass from waiting half a second
+        threading.Thread(target=cls.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/file.whl'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls._tmpdir)
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'file.whl')
+        patcher = patch.dict(os.environ, {'NO_PROXY': '*'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fresh_download(self):
         """Test downloading a file from scratch."""
-        mock_exists.return_value = False
+        download_with_python(self.url, self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.PAYLOAD)
+        self.assertFalse(os.path.exists(self.filename + DOWNLOAD_STATE_SUFFIX))
+
+    def test_download_returns_digest(self):
+        """Test that the file is hashed while it is written."""
+        expected = hashlib.sha256(self.PAYLOAD).hexdigest()
+
+        self.assertEqual(download_with_python(self.url, self.filename, f'sha256={expected}'), expected)
+
+
+def fake_open_url(payload, requested_ranges, supports_ranges=True):
+    """Returns an _open_url replacement serving payload, honouring Range headers if supported."""
+    def open_url(url, headers, timeout=30):
+        range_header = headers.get('Range')
+        requested_ranges.append(range_header)
+        response = MagicMock()
+        if range_header and supports_ranges:
+            start, end = range_header[len('bytes='):].split('-')
+            start, end = int(start), int(end or len(payload) - 1)
+            body = payload[start:end + 1]
+            response.status = 206
+            response.headers = {'Content-Range': f'bytes {start}-{end}/{len(payload)}',
+                                'Content-Length': str(len(body))}
+        else:
+            body = payload
+            response.status = 200
+            response.headers = {'Content-Length': str(len(payload))}
+        stream = BytesIO(body)
+        response.read, response.readinto = stream.read, stream.readinto
+        response.__enter__.return_value = response
+        return response
+    return open_url
+
+
+class TestParallelDownload(unittest.TestCase):
+    """Test downloading with concurrent range requests."""
+
+    PAYLOAD = bytes(range(100))
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'pkg.whl')
+        self.state_path = self.filename + DOWNLOAD_STATE_SUFFIX
+        for patcher in (patch('rpip.main.PARALLEL_DOWNLOAD_MIN_SIZE', 0),
+                        patch('rpip.main.PARALLEL_SEGMENT_SIZE', 16)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @unittest.skipUnless(hasattr(os, 'pwrite'), 'os.pwrite is not available')
+    def test_fresh_parallel_download(self):
+        """Test that the file is assembled from one request per segment."""
+        requested = []
+        with patch('rpip.main._open_url', fake_open_url(self.PAYLOAD, requested)):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.PAYLOAD)
+        self.assertFalse(os.path.exists(self.state_path))
+        self.assertEqual(requested[0], 'bytes=0-0')
+        self.assertEqual(sorted(requested[1:], key=lambda r: int(r[6:].split('-')[0])),
+                         [f'bytes={start}-{min(start + 16, 100) - 1}' for start in range(0, 100, 16)])
+
+    @unittest.skipUnless(hasattr(os, 'pwrite'), 'os.pwrite is not available')
+    def test_resume_parallel_download(self):
+        """Test that only segments missing from the state file are downloaded again."""
+        with open(self.filename, 'wb') as f:
+            f.write(self.PAYLOAD[:32] + bytes(68))
+        with open(self.state_path, 'w') as f:
+            json.dump({'size': 100, 'done': [[0, 32]]}, f)
+
+        requested = []
+        with patch('rpip.main._open_url', fake_open_url(self.PAYLOAD, requested)):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.PAYLOAD)
+        self.assertNotIn('bytes=0-15', requested)
+        self.assertNotIn('bytes=16-31', requested)
+        self.assertIn('bytes=32-47', requested)
+
+    def test_single_stream_returns_digest(self):
+        """Test that a resumed single-stream download hashes the existing prefix and new bytes."""
+        with open(self.filename, 'wb') as f:
+            f.write(self.PAYLOAD[:40])
+
+        with patch('rpip.main._open_url', fake_open_url(self.PAYLOAD, [])):
+            digest = download_with_python('http://example.com/pkg.whl', self.filename,
+                                          'sha256=' + hashlib.sha256(self.PAYLOAD).hexdigest())
+
+        self.assertEqual(digest, hashlib.sha256(self.PAYLOAD).hexdigest())
+
+    @patch('rpip.main.DOWNLOAD_CHUNK_SIZE', 10)
+    @patch('rpip.main.PARALLEL_DOWNLOAD_MIN_SIZE', 1000)
+    def test_interrupted_single_stream_keeps_state(self):
+        """Test that a preallocated single-stream download records its prefix and resumes from it."""
+        serve = fake_open_url(self.PAYLOAD, [])
+
+        def interrupted(url, headers, timeout=30):
+            response = serve(url, headers, timeout)
+            readinto, sent = response.readinto, [0]
+
+            def readinto_until_reset(buffer):
+                if sent[0] >= 30:
+                    raise ConnectionResetError('connection reset')
+                received = readinto(buffer)
+                sent[0] += received
+                return received
+            response.readinto = readinto_until_reset
+            return response
+
+        with patch('rpip.main._open_url', interrupted), self.assertRaises(SystemExit):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        self.assertEqual(os.path.getsize(self.filename), 100)
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f), {'size': 100, 'done': [[0, 30]]})
+
+        requested = []
+        with patch('rpip.main._open_url', fake_open_url(self.PAYLOAD, requested)):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.PAYLOAD)
+        self.assertFalse(os.path.exists(self.state_path))
+        self.assertNotIn('bytes=0-15', requested)
+
+    @unittest.skipUnless(hasattr(os, 'pwrite'), 'os.pwrite is not available')
+    def test_falls_back_without_range_support(self):
+        """Test that a server ignoring Range headers gets a single plain request."""
+        requested = []
+        with patch('rpip.main._open_url', fake_open_url(self.PAYLOAD, requested, supports_ranges=False)):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.PAYLOAD)
+        self.assertEqual(requested, ['bytes=0-0', None])
+
+    def test_failed_probe_keeps_state(self):
+        """Test that a network error while probing leaves a resumable download on disk."""
+        with open(self.filename, 'wb') as f:
+            f.write(self.PAYLOAD[:50] + bytes(50))
+        with open(self.state_path, 'w') as f:
+            json.dump({'size': 100, 'done': [[0, 50]]}, f)
+
+        with patch('rpip.main._open_url', side_effect=URLError('temporary failure in name resolution')), \
+                self.assertRaises(SystemExit):
+            download_with_python('http://example.com/pkg.whl', self.filename)
+
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(50), self.PAYLOAD[:50])
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f), {'size': 100, 'done': [[0, 50]]})
+
+    def test_missing_ranges(self):
+        """Test splitting the gaps between completed ranges into segments."""
+        self.assertEqual(_missing_ranges([[10, 20], [0, 5]], 40, 8),
+                         [(5, 10), (20, 28), (28, 36), (36, 40)])
+
+
+class TestAria2cBatchDownload(unittest.TestCase):
+    """Test downloading all packages of a requirements file with one aria2c run."""
+
+    RESOLUTIONS = [
+        ('https://example.com/a-1.0-py3-none-any.whl', 'a-1.0-py3-none-any.whl', 'sha256=aaa'),
+        ('https://example.com/b-1.0-py3-none-any.whl', 'b-1.0-py3-none-any.whl', None),
+        ('https://example.com/c-1.0-py3-none-any.whl', 'c-1.0-py3-none-any.whl', 'sha1=ccc'),
+    ]
+
+    @patch('rpip.main._run_subprocess')
+    def test_single_aria2c_run(self, mock_run):
+        """Test that one aria2c run gets every URL with its output name and checksum."""
+        input_files = []
 
-        # Mock response
-        mock_response = MagicMock()
-        mock_response.headers.get.return_value = '100'
-        mock_response.read.side_effect = [b'chunk1', b'chunk2', b'']
-        mock_response.__enter__ = Mock(return_value=mock_response)
-        mock_response.__exit__ = Mock(return_value=False)
-        mock_urlopen.return_value = mock_response
+        def run(cmd):
+            with open(cmd[cmd.index('-i') + 1], encoding='utf-8') as f:
+                input_files.append(f.read())
+        mock_run.side_effect = run
 
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            temp_file = f.name
+        fetched = download_batch_with_aria2c(self.RESOLUTIONS)
 
-        try:
-            # Import here to avoid import errors
-            from rpip.main import download_with_python
+        mock_run.assert_called_once()
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[0], 'aria2c')
+        self.assertIn('--check-integrity=true', cmd)
+        self.assertIn('out=a-1.0-py3-none-any.whl\n  checksum=sha-256=aaa\n', input_files[0])
+        self.assertIn('https://example.com/b-1.0-py3-none-any.whl\n  out=b-1.0-py3-none-any.whl\n',
+                      input_files[0])
+        # Hashes aria2c cannot check are left to the per-package verification
+        self.assertEqual(fetched, {'a-1.0-py3-none-any.whl', 'b-1.0-py3-none-any.whl'})
+
+    @patch('rpip.main._run_subprocess')
+    def test_failed_run(self, mock_run):
+        """Test that a failed aria2c run reports no file as downloaded."""
+        mock_run.side_effect = subprocess.CalledProcessError(7, 'aria2c')
+
+        self.assertEqual(download_batch_with_aria2c(self.RESOLUTIONS), set())
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test keep-alive connection reuse of the Python downloader."""
+
+    @classmethod
+    def setUpClass(cls):
+        ports = cls.client_ports = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                ports.append(self.client_address[1])
+                if self.path == '/redirect':
+                    self.send_response(302)
+                    self.send_header('Location', '/file.whl')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', '5')
+                self.end_headers()
+                self.wfile.write(b'hello')
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
 
-            # This would normally work, but we'll skip full integration test
-            # download_with_python('http://example.com/file.whl', temp_file)
-            pass
-        finally:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+    def setUp(self):
+        self.client_ports.clear()
+
+    @patch.dict(os.environ, {'NO_PROXY': '*'})
+    @patch('rpip.main._send_request', side_effect=URLError('refused'))
+    def test_default_ports(self, mock_send_request):
+        """Test that URLs without a port connect to the scheme's default port."""
+        for url, key in (('http://[::1]/file.whl', ('http', '::1', 80)),
+                         ('https://example.com/file.whl', ('https', 'example.com', 443)),
+                         ('http://[::1]:8080/file.whl', ('http', '::1', 8080))):
+            with self.assertRaises(URLError), _open_url(url, {}):
+                pass
+            self.assertEqual(mock_send_request.call_args[0][0], key)
+
+    @patch.dict(os.environ, {'NO_PROXY': '*'})
+    def test_connection_reused(self):
+        """Test that consecutive requests to one host share a single connection."""
+        for _ in range(3):
+            with _open_url(f'{self.base_url}/file.whl', {}) as response:
+                self.assertEqual(response.read(), b'hello')
+
+        self.assertEqual(len(self.client_ports), 3)
+        self.assertEqual(len(set(self.client_ports)), 1)
+
+    @patch.dict(os.environ, {'NO_PROXY': '*'})
+    def test_follows_redirects(self):
+        """Test that redirects are followed on the pooled connection."""
+        with _open_url(f'{self.base_url}/redirect', {}) as response:
+            self.assertEqual(response.read(), b'hello')
+
+        self.assertEqual(len(self.client_ports), 2)
 
 
 class TestEditableInstalls(unittest.TestCase):
     """Test editable install functions."""
 
+    def setUp(self):
+        patcher = patch('rpip.main.subprocess.run', autospec=True)
+        self.mock_run = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_is_editable_install_with_dash_e(self):
         """Test detection of -e style editable installs."""
         self.assertTrue(is_editable_install('-e git+https://github.com/user/repo.git'))
@@ -285,54 +928,129 @@ class TestEditableInstalls(unittest.TestCase):
         self.assertFalse(is_editable_install('numpy>=1.20.0'))
         self.assertFalse(is_editable_install('pandas'))
 
-    @patch('subprocess.run')
-    def test_install_editable_package_dash_e(self, mock_run):
+    def test_install_editable_package_dash_e(self):
         """Test installing editable package with -e flag."""
-        mock_run.return_value = MagicMock(returncode=0)
+        self.mock_run.return_value = MagicMock(returncode=0)
 
         result = install_editable_package('-e /path/to/package', [])
 
         self.assertTrue(result)
-        mock_run.assert_called_once()
-        args = mock_run.call_args[0][0]
+        self.mock_run.assert_called_once()
+        args = self.mock_run.call_args[0][0]
         self.assertIn('-e', args)
         self.assertIn('/path/to/package', args)
 
-    @patch('subprocess.run')
-    def test_install_editable_package_double_dash(self, mock_run):
+    def test_install_editable_package_double_dash(self):
         """Test installing editable package with --editable flag."""
-        mock_run.return_value = MagicMock(returncode=0)
+        self.mock_run.return_value = MagicMock(returncode=0)
 
         result = install_editable_package('--editable git+https://github.com/user/repo.git', [])
 
         self.assertTrue(result)
-        mock_run.assert_called_once()
-        args = mock_run.call_args[0][0]
+        self.mock_run.assert_called_once()
+        args = self.mock_run.call_args[0][0]
         self.assertIn('-e', args)
         self.assertIn('git+https://github.com/user/repo.git', args)
 
-    @patch('subprocess.run')
-    def test_install_editable_package_with_extra_args(self, mock_run):
+    def test_install_editable_package_with_extra_args(self):
         """Test installing editable package with additional pip arguments."""
-        mock_run.return_value = MagicMock(returncode=0)
+        self.mock_run.return_value = MagicMock(returncode=0)
 
         result = install_editable_package('-e .', ['--user', '--no-deps'])
 
         self.assertTrue(result)
-        mock_run.assert_called_once()
-        args = mock_run.call_args[0][0]
+        self.mock_run.assert_called_once()
+        args = self.mock_run.call_args[0][0]
         self.assertIn('--user', args)
         self.assertIn('--no-deps', args)
 
-    @patch('subprocess.run')
-    def test_install_editable_package_failure(self, mock_run):
+    def test_install_editable_package_failure(self):
         """Test handling of failed editable install."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, 'pip')
+        # pip runs with check=True, so a failure only surfaces as CalledProcessError;
+        # a mock returning returncode=1 would not exercise this path
+        self.mock_run.side_effect = subprocess.CalledProcessError(1, 'pip')
 
         result = install_editable_package('-e /nonexistent/path', [])
 
         self.assertFalse(result)
+        self.assertTrue(self.mock_run.call_args[1]['check'])
+
+
+class TestInstallPackage(unittest.TestCase):
+    """Test installing downloaded files through pip."""
+
+    @patch('subprocess.run')
+    @patch('rpip.main._load_pip_main')
+    def test_installs_in_process(self, mock_load_pip_main, mock_run):
+        """Test that pip's in-process entry point is used when available."""
+        mock_load_pip_main.return_value.return_value = 0
+
+        self.assertTrue(install_package('requests-2.28.0-py3-none-any.whl', ['--user']))
+
+        mock_load_pip_main.return_value.assert_called_once_with(
+            ['install', 'requests-2.28.0-py3-none-any.whl', '--user'])
+        mock_run.assert_not_called()
+
+    @patch('rpip.main._load_pip_main')
+    def test_in_process_failure(self, mock_load_pip_main):
+        """Test that a non-zero pip status is reported as a failed install."""
+        mock_load_pip_main.return_value.return_value = 1
+
+        self.assertFalse(install_package('requests-2.28.0-py3-none-any.whl', []))
+
+    @patch('subprocess.run')
+    @patch('rpip.main._load_pip_main')
+    def test_subprocess_fallback(self, mock_load_pip_main, mock_run):
+        """Test that pip runs as a subprocess without an in-process entry point or for pip itself."""
+        for pip_main, filename in ((None, 'requests-2.28.0-py3-none-any.whl'),
+                                   (Mock(return_value=0), 'pip-24.0-py3-none-any.whl')):
+            mock_load_pip_main.return_value = pip_main
+            mock_run.reset_mock()
+
+            self.assertTrue(install_package(filename, []))
+
+            mock_run.assert_called_once()
+            self.assertEqual(mock_run.call_args[0][0], [sys.executable, '-m', 'pip', 'install', filename])
+            if pip_main is not None:
+                pip_main.assert_not_called()
+
+    @patch('pip._internal.metadata._should_use_importlib_metadata', return_value=False)
+    def test_pkg_resources_backend_uses_subprocess(self, mock_should_use_importlib_metadata):
+        """Test that pip does not run in-process with its pkg_resources metadata backend."""
+        self.assertIsNone(_load_pip_main())
+
+    def test_dependent_installs(self):
+        """Test that a wheel installed right after its dependency finds that dependency."""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        env = dict(os.environ, PYTHONUSERBASE=tmpdir, PIP_NO_INDEX='1', PIP_DISABLE_PIP_VERSION_CHECK='1',
+                   PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        user_site = subprocess.run([sys.executable, '-c', 'import site; print(site.getusersitepackages())'],
+                                   env=env, capture_output=True, text=True, check=True).stdout.strip()
+        # The user site is only on sys.path if it exists when Python starts
+        os.makedirs(user_site)
+
+        base = _build_wheel(tmpdir, 'rpip_test_base')
+        app = _build_wheel(tmpdir, 'rpip_test_app', 'Requires-Dist: rpip-test-base\n')
+        script = ('import sys\nfrom rpip.main import install_package\n'
+                  'sys.exit(not all(install_package(f, ["--user"]) for f in sys.argv[1:]))')
+        result = subprocess.run([sys.executable, '-c', script, base, app],
+                                env=env, capture_output=True, text=True)
+
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertTrue(os.path.isdir(os.path.join(user_site, 'rpip_test_app-1.0.dist-info')))
+
 
+def _build_wheel(directory: str, name: str, metadata: str = '') -> str:
+    """Writes an empty pure-Python wheel and returns its path."""
+    dist_info = f'{name}-1.0.dist-info'
+    filename = os.path.join(directory, f'{name}-1.0-py3-none-any.whl')
+    with zipfile.ZipFile(filename, 'w') as wheel:
+        wheel.writestr(f'{dist_info}/METADATA', f'Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n{metadata}')
+        wheel.writestr(f'{dist_info}/WHEEL', 'Wheel-Version: 1.0\nGenerator: rpip-tests\n'
+                                             'Root-Is-Purelib: true\nTag: py3-none-any\n')
+        wheel.writestr(f'{dist_info}/RECORD', f'{dist_info}/METADATA,,\n{dist_info}/WHEEL,,\n{dist_info}/RECORD,,\n')
+    return filename
 
 if __name__ == '__main__':
     unittest.main()